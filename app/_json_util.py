@@ -0,0 +1,25 @@
+"""JSON extraction from LLM responses, shared by the agent and chat pipelines."""
+
+import re
+
+import orjson
+
+_FENCED_JSON_RE = re.compile(r"```(?:json)?\s*(\{.*?\})\s*```", re.DOTALL)
+_BARE_JSON_RE = re.compile(r"\{.*\}", re.DOTALL)
+
+
+def parse_json(raw_text: str) -> dict:
+    """Extract JSON from the LLM response, handling markdown fences and mixed text.
+
+    Tries a fenced ```json block first, then the span from the first "{" to the
+    last "}". Raises orjson.JSONDecodeError if neither parses.
+    """
+    fenced = _FENCED_JSON_RE.search(raw_text)
+    if fenced:
+        try:
+            return orjson.loads(fenced.group(1))
+        except orjson.JSONDecodeError:
+            pass
+
+    bare = _BARE_JSON_RE.search(raw_text)
+    return orjson.loads(bare.group(0) if bare else raw_text)
@@ -1,17 +1,29 @@
 """Clinical Decision Support Agent using LangGraph + Gemini."""
 
-import json
+import asyncio
+import logging
 import os
+import threading
 
+import orjson
 from langchain_core.tools import tool
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langgraph.prebuilt import create_react_agent
 
-from app.models import AssessResponse, Citation
-from app.rag import query_guidelines
-from app.tools import get_patient
+from app._json_util import parse_json
+from app.models import AssessResponse, Citation, PatientInfo
+from app.rag import SIMILARITY_THRESHOLD, citations_from_chunks, query_guidelines, warm_symptom_embeddings
+from app.rules import match_rule
+from app.tools import get_patient, get_patient_json
 
 GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-1.5-flash")
+RULES_ENABLED = os.environ.get("ASSESS_RULES_ENABLED", "1") != "0"
+
+logger = logging.getLogger(__name__)
+
+_agent = None
+_agent_key: tuple[str, str | None] | None = None
+_agent_lock = threading.Lock()
 
 SYSTEM_PROMPT = """You are a Clinical Decision Support Agent specializing in cancer risk assessment
 using the NG12 guidelines ("Suspected cancer: recognition and referral").
@@ -57,49 +69,119 @@ You MUST respond with valid JSON in exactly this format:
 @tool
 def get_patient_data(patient_id: str) -> str:
     """Retrieve patient clinical data by their patient ID."""
-    patient = get_patient(patient_id)
-    return json.dumps(patient.model_dump(), indent=2)
+    return get_patient_json(patient_id)
 
 
 @tool
 def search_guidelines(symptoms: list[str]) -> str:
     """Search the NG12 guidelines for sections relevant to the given symptoms."""
     chunks = query_guidelines(symptoms, top_k=8)
-    return json.dumps(chunks, indent=2)
+    return orjson.dumps(chunks.as_dicts(), option=orjson.OPT_INDENT_2).decode()
 
 
-def _build_agent():
+def _build_agent(api_key: str | None):
     llm = ChatGoogleGenerativeAI(
         model=GEMINI_MODEL,
-        google_api_key=os.environ.get("GOOGLE_API_KEY"),
+        google_api_key=api_key,
         temperature=0.1,
     )
     return create_react_agent(llm, [get_patient_data, search_guidelines], prompt=SYSTEM_PROMPT)
 
 
-def _parse_json(raw_text: str) -> dict:
-    text = raw_text
-    if "```json" in text:
-        text = text.split("```json")[1].split("```")[0]
-    elif "```" in text:
-        text = text.split("```")[1].split("```")[0]
-    return json.loads(text.strip())
+def _get_agent():
+    """Return the compiled ReAct agent, building it once per (model, API key)."""
+    global _agent, _agent_key
+    key = (GEMINI_MODEL, os.environ.get("GOOGLE_API_KEY"))
+    if _agent is None or _agent_key != key:
+        with _agent_lock:
+            if _agent is None or _agent_key != key:
+                _agent = _build_agent(key[1])
+                _agent_key = key
+    return _agent
+
+
+def _rule_citations(query: str) -> list[Citation]:
+    """Cite the best-matching NG12 chunk for a rule, if retrieval finds a relevant one.
+
+    The rule's answer does not depend on retrieval, so a failed search only loses the citation.
+    """
+    try:
+        chunks = query_guidelines([query], top_k=1)
+    except Exception:
+        logger.warning("Citation retrieval failed for rule query %r", query, exc_info=True)
+        return []
+    return citations_from_chunks(chunks) if len(chunks) and chunks.distances[0] < SIMILARITY_THRESHOLD else []
+
+
+def _assess_by_rule(patient: PatientInfo, rule: dict) -> AssessResponse:
+    """Build the assessment for a deterministic rule, citing the best-matching NG12 chunk."""
+    citations = _rule_citations(rule["citation_query"]) if rule["citation_query"] else []
+
+    return AssessResponse(
+        patient_id=patient.patient_id,
+        patient_name=patient.name,
+        risk_level=rule["risk_level"],
+        assessment=rule["assessment"].format(**patient.model_dump()),
+        citations=citations,
+    )
+
+
+TOOL_STATUS = {
+    "get_patient_data": "Retrieving patient data",
+    "search_guidelines": "Searching the NG12 guidelines",
+}
+
+
+async def assess_patient(patient_id: str) -> AssessResponse:
+    async for kind, payload in stream_assess_patient(patient_id):
+        if kind == "done":
+            return payload
+
 
+async def stream_assess_patient(patient_id: str):
+    """Run an assessment, yielding ("status", text) as the agent calls its tools and
+    ("done", AssessResponse) at the end."""
+    patient = get_patient(patient_id)
 
-def assess_patient(patient_id: str) -> AssessResponse:
-    agent = _build_agent()
+    # Obvious low-risk records (no recorded symptoms) are answered by rule without an LLM round trip
+    rule = match_rule(patient) if RULES_ENABLED else None
+    if rule is not None:
+        yield "status", "Matched an NG12 rule"
+        yield "done", await asyncio.to_thread(_assess_by_rule, patient, rule)
+        return
 
-    result = agent.invoke({"messages": [("user", (
-        f"Assess the cancer risk for patient {patient_id}. "
-        "Retrieve their data, search the NG12 guidelines for their symptoms, "
-        "and provide a risk assessment with citations."
-    ))]})
+    agent = _get_agent()
 
-    final_text = result["messages"][-1].content
+    # Embed the recorded symptoms while the agent makes its first LLM call. The agent
+    # usually searches with symptoms copied from the patient record, and any of them,
+    # alone or combined, then skips the embedding request. Reworded symptoms miss,
+    # so the prefetch can be a wasted embedding call.
+    prefetch = asyncio.create_task(asyncio.to_thread(warm_symptom_embeddings, patient.symptoms))
+    # A failed warm-up is harmless: the agent's own search embeds whatever is missing
+    prefetch.add_done_callback(lambda t: t.cancelled() or t.exception())
 
+    final_message = None
+    try:
+        async for update in agent.astream({"messages": [("user", (
+            f"Assess the cancer risk for patient {patient_id}. "
+            "Retrieve their data, search the NG12 guidelines for their symptoms, "
+            "and provide a risk assessment with citations."
+        ))]}, stream_mode="updates"):
+            for node_output in update.values():
+                for message in node_output.get("messages", []):
+                    final_message = message
+                    for call in getattr(message, "tool_calls", None) or []:
+                        yield "status", TOOL_STATUS.get(call["name"], f"Calling {call['name']}")
+    finally:
+        # Once the agent has stopped, for any reason, nothing waits on the warm-up
+        prefetch.cancel()
+
+    yield "done", _parse_assessment(patient, final_message.content)
+
+
+def _parse_assessment(patient: PatientInfo, final_text: str) -> AssessResponse:
     try:
-        parsed = _parse_json(final_text)
-        patient = get_patient(patient_id)
+        parsed = parse_json(final_text)
 
         citations = [
             Citation(
@@ -112,17 +194,16 @@ def assess_patient(patient_id: str) -> AssessResponse:
         ]
 
         return AssessResponse(
-            patient_id=patient_id,
+            patient_id=patient.patient_id,
             patient_name=patient.name,
             risk_level=parsed.get("risk_level", "Unknown"),
             assessment=parsed.get("assessment", final_text),
             citations=citations,
         )
 
-    except (json.JSONDecodeError, KeyError):
-        patient = get_patient(patient_id)
+    except (orjson.JSONDecodeError, KeyError):
         return AssessResponse(
-            patient_id=patient_id,
+            patient_id=patient.patient_id,
             patient_name=patient.name,
             risk_level="Assessment Error",
             assessment=f"Agent returned non-JSON response: {final_text}",
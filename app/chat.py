@@ -1,17 +1,28 @@
 """Conversational RAG pipeline for NG12 guideline Q&A."""
 
-import json
+import asyncio
 import os
+import re
+import threading
 
+import orjson
 from langchain_google_genai import ChatGoogleGenerativeAI
 
+from app._json_util import parse_json
 from app.models import ChatMessage, ChatResponse, Citation
-from app.rag import query_guidelines_text
+from app.rag import SIMILARITY_THRESHOLD, RagResults, citations_from_chunks, query_guidelines_text
+from app.sessions import create_session_store
 
 GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-1.5-flash")
-SIMILARITY_THRESHOLD = 1.2  # ChromaDB cosine distance: 0 = identical, 2 = opposite
+HISTORY_MAX_MESSAGES = 20  # prior turns sent to Gemini, newest first
+HISTORY_TOKEN_BUDGET = 4000  # ...until their estimated size exceeds this
+CHARS_PER_TOKEN = 4  # rough estimate for English text
 
-_sessions: dict[str, list[ChatMessage]] = {}
+_sessions = create_session_store()
+
+_llm = None
+_llm_key: tuple[str, str | None] | None = None
+_llm_lock = threading.Lock()
 
 SYSTEM_PROMPT = """You are an NG12 Clinical Knowledge Assistant. Your sole purpose is to
 answer questions about the NICE NG12 guidelines ("Suspected cancer: recognition and referral")
@@ -58,6 +69,30 @@ Respond with ONLY this JSON (no markdown, no extra text):
 }
 """
 
+STREAM_SYSTEM_PROMPT = """You are an NG12 Clinical Knowledge Assistant. Your sole purpose is to
+answer questions about the NICE NG12 guidelines ("Suspected cancer: recognition and referral")
+using ONLY the retrieved guideline passages provided below.
+
+## Output Rules:
+- Answer in plain text (Markdown lists and bold are fine). Do NOT output JSON.
+- Do NOT repeat the retrieved passages verbatim. SYNTHESIZE and SUMMARIZE the information
+  in your own words, organized clearly for the reader.
+- Refer to the passages you rely on by page number (e.g. "(NG12 p.23)"); the full
+  citations are attached to your answer automatically.
+
+## Strict Rules:
+1. ONLY use information from the RETRIEVED CONTEXT below. Never use your own knowledge.
+2. NEVER invent or guess:
+   - Age thresholds (e.g., "refer if over 40") unless the retrieved text explicitly states them.
+   - Investigation intervals or timelines not found in the retrieved text.
+   - Referral criteria not present in the retrieved text.
+3. NEVER reference documents other than NG12.
+4. If the retrieved context does not contain enough information to answer the question,
+   you MUST say: "I couldn't find clear support in the NG12 guidelines for that question."
+5. When the user asks a follow-up, use the conversation history for context but still
+   ground your answer in the retrieved guideline passages.
+"""
+
 LOW_EVIDENCE_ANSWER = (
     "I couldn't find support in the NG12 text for that question. "
     "The retrieved guideline passages did not contain relevant information. "
@@ -65,15 +100,17 @@ LOW_EVIDENCE_ANSWER = (
     "symptoms, or referral criteria covered by the NG12 guidelines."
 )
 
-GREETING_EXACT = {
+GREETING_EXACT = frozenset({
     "hi", "hii", "hiii", "hey", "hello", "howdy", "sup", "yo",
     "good morning", "good afternoon", "good evening", "good night",
     "thanks", "thank you", "bye", "goodbye", "see you",
     "what's up", "whats up", "how are you", "who are you",
     "what can you do", "help",
-}
+})
+
+GREETING_WORDS = frozenset({"hi", "hii", "hiii", "hey", "hello", "howdy", "sup", "yo", "bye", "goodbye"})
 
-GREETING_WORDS = {"hi", "hii", "hiii", "hey", "hello", "howdy", "sup", "yo", "bye", "goodbye"}
+_TRAILING_PUNCT = "!?.,"
 
 GREETING_RESPONSE = (
     "Hi there! I'm the NG12 Clinical Knowledge Assistant. I can help you with "
@@ -88,16 +125,66 @@ DISCLAIMER_PHRASES = [
     "not contain relevant",
 ]
 
+# One alternation scans the answer once instead of once per phrase
+_DISCLAIMER_RE = re.compile("|".join(re.escape(p) for p in DISCLAIMER_PHRASES), re.IGNORECASE)
 
-def _build_llm():
+
+def _build_llm(api_key: str | None):
     return ChatGoogleGenerativeAI(
         model=GEMINI_MODEL,
-        google_api_key=os.environ.get("GOOGLE_API_KEY"),
+        google_api_key=api_key,
         temperature=0.1,
     )
 
 
-def _format_context(chunks: list[dict]) -> str:
+def _get_llm():
+    """Return the shared chat model, building it once per (model, API key)."""
+    global _llm, _llm_key
+    key = (GEMINI_MODEL, os.environ.get("GOOGLE_API_KEY"))
+    if _llm is None or _llm_key != key:
+        with _llm_lock:
+            if _llm is None or _llm_key != key:
+                _llm = _build_llm(key[1])
+                _llm_key = key
+    return _llm
+
+
+def _estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _history_window(history: list[ChatMessage]) -> list[ChatMessage]:
+    """Newest messages that fit HISTORY_TOKEN_BUDGET, dropping the oldest user/assistant
+    pairs whole. The latest pair is always kept so a follow-up never loses its referent."""
+    history = history[-HISTORY_MAX_MESSAGES:]
+    start = len(history)
+    tokens = 0
+    while start > 0:
+        pair_start = max(start - 2, 0)
+        tokens += sum(_estimate_tokens(m.content) for m in history[pair_start:start])
+        if tokens > HISTORY_TOKEN_BUDGET and start < len(history):
+            break
+        start = pair_start
+    return history[start:]
+
+
+def _build_messages(system_prompt: str, history: list[ChatMessage], chunks: RagResults, message: str) -> list:
+    """Static instructions first, then history trimmed to the token budget, then the
+    per-turn retrieved context and question. Keeping the unchanging prefix first lets
+    Gemini's implicit prompt caching reuse it across turns."""
+    messages = [("system", system_prompt)]
+
+    for msg in _history_window(history):
+        messages.append((msg.role, msg.content))
+
+    messages.append(("user", (
+        f"RETRIEVED CONTEXT:\n{_format_context(chunks)}\n\n"
+        f"USER QUESTION:\n{message}"
+    )))
+    return messages
+
+
+def _format_context(chunks: RagResults) -> str:
     if not chunks:
         return "No relevant guideline passages were retrieved."
     parts = []
@@ -109,95 +196,50 @@ def _format_context(chunks: list[dict]) -> str:
     return "\n\n---\n\n".join(parts)
 
 
-def _has_good_evidence(chunks: list[dict]) -> bool:
-    if not chunks:
-        return False
-    return min(c["distance"] for c in chunks) < SIMILARITY_THRESHOLD
+def _has_good_evidence(chunks: RagResults) -> bool:
+    # min() rather than the first row, since fused results are ordered by RRF score
+    return len(chunks) > 0 and bool(chunks.distances.min() < SIMILARITY_THRESHOLD)
 
 
 def _is_greeting(text: str) -> bool:
-    cleaned = text.strip().lower().rstrip("!?.,")
+    cleaned = text.strip().lower().rstrip(_TRAILING_PUNCT)
     if cleaned in GREETING_EXACT:
         return True
     # Short messages containing a greeting word (e.g. "hii how are u")
-    if len(cleaned) < 60 and set(cleaned.split()) & GREETING_WORDS:
-        return True
-    return False
+    return len(cleaned) < 60 and any(w in GREETING_WORDS for w in cleaned.split())
 
 
 def _is_disclaimer(text: str) -> bool:
-    lower = text.lower()
-    return any(p in lower for p in DISCLAIMER_PHRASES)
-
+    return _DISCLAIMER_RE.search(text) is not None
 
-def _parse_json(raw_text: str) -> dict:
-    """Extract JSON from the LLM response, handling markdown fences and mixed text."""
-    text = raw_text
-    if "```json" in text:
-        text = text.split("```json")[1].split("```")[0]
-    elif "```" in text:
-        text = text.split("```")[1].split("```")[0]
-
-    try:
-        return json.loads(text.strip())
-    except json.JSONDecodeError:
-        first = raw_text.find("{")
-        last = raw_text.rfind("}")
-        if first != -1 and last > first:
-            return json.loads(raw_text[first:last + 1])
-        raise
-
-
-def _citations_from_chunks(chunks: list[dict], limit: int = 3) -> list[Citation]:
-    return [
-        Citation(
-            source="NG12 PDF",
-            page=c["page"],
-            chunk_id=c["chunk_id"],
-            excerpt=c["text"][:200] + "..." if len(c["text"]) > 200 else c["text"],
-        )
-        for c in chunks[:limit]
-    ]
 
-
-def chat_with_guidelines(session_id: str, message: str, top_k: int = 5) -> ChatResponse:
-    if session_id not in _sessions:
-        _sessions[session_id] = []
-
-    history = _sessions[session_id]
-    history.append(ChatMessage(role="user", content=message))
+async def chat_with_guidelines(session_id: str, message: str, top_k: int = 5) -> ChatResponse:
+    history = _sessions.get(session_id, last=HISTORY_MAX_MESSAGES)
+    user_message = ChatMessage(role="user", content=message)
 
     # Handle greetings without hitting RAG
     if _is_greeting(message):
-        history.append(ChatMessage(role="assistant", content=GREETING_RESPONSE, citations=[]))
+        _sessions.append(session_id, user_message, ChatMessage(role="assistant", content=GREETING_RESPONSE, citations=[]))
         return ChatResponse(session_id=session_id, answer=GREETING_RESPONSE, citations=[])
 
     # Retrieve relevant guideline chunks
-    retrieved_chunks = query_guidelines_text(message, top_k=top_k)
+    retrieved_chunks = await asyncio.to_thread(query_guidelines_text, message, top_k=top_k)
 
     # Bail early if evidence is too weak
     if not _has_good_evidence(retrieved_chunks):
-        history.append(ChatMessage(role="assistant", content=LOW_EVIDENCE_ANSWER, citations=[]))
+        _sessions.append(session_id, user_message, ChatMessage(role="assistant", content=LOW_EVIDENCE_ANSWER, citations=[]))
         return ChatResponse(session_id=session_id, answer=LOW_EVIDENCE_ANSWER, citations=[])
 
-    # Build the message list for Gemini
-    messages = [("system", SYSTEM_PROMPT)]
-
-    for msg in history[:-1][-20:]:
-        messages.append((msg.role, msg.content))
-
-    messages.append(("user", (
-        f"RETRIEVED CONTEXT:\n{_format_context(retrieved_chunks)}\n\n"
-        f"USER QUESTION:\n{message}"
-    )))
+    # May create or renew the Gemini prompt cache, which is a network call
+    llm = await asyncio.to_thread(_get_llm)
+    messages = _build_messages(SYSTEM_PROMPT, history, retrieved_chunks, message)
 
     # Call LLM
-    llm = _build_llm()
-    raw_text = llm.invoke(messages).content
+    raw_text = (await llm.ainvoke(messages)).content
 
     # Parse the JSON response
     try:
-        parsed = _parse_json(raw_text)
+        parsed = parse_json(raw_text)
         answer = parsed.get("answer", raw_text)
         citations = [
             Citation(
@@ -212,25 +254,59 @@ def chat_with_guidelines(session_id: str, message: str, top_k: int = 5) -> ChatR
         if _is_disclaimer(answer):
             citations = []
         elif not citations and _has_good_evidence(retrieved_chunks):
-            citations = _citations_from_chunks(retrieved_chunks)
+            citations = citations_from_chunks(retrieved_chunks, limit=3)
 
-    except (json.JSONDecodeError, KeyError):
+    except (orjson.JSONDecodeError, KeyError):
         answer = raw_text
         if _is_disclaimer(answer):
             citations = []
         else:
-            citations = _citations_from_chunks(retrieved_chunks)
+            citations = citations_from_chunks(retrieved_chunks, limit=3)
 
-    history.append(ChatMessage(role="assistant", content=answer, citations=citations))
+    _sessions.append(session_id, user_message, ChatMessage(role="assistant", content=answer, citations=citations))
     return ChatResponse(session_id=session_id, answer=answer, citations=citations)
 
 
+async def stream_chat_with_guidelines(session_id: str, message: str, top_k: int = 5):
+    """Stream an answer as it is generated.
+
+    Yields ("token", text) for each answer delta, then ("done", ChatResponse) once
+    the turn is complete. The model answers in plain text, so tokens can be shown
+    immediately; citations are taken from the top retrieved chunks instead of
+    being parsed out of the model output.
+    """
+    history = _sessions.get(session_id, last=HISTORY_MAX_MESSAGES)
+    user_message = ChatMessage(role="user", content=message)
+
+    if _is_greeting(message):
+        answer = GREETING_RESPONSE
+        retrieved_chunks = []
+    else:
+        retrieved_chunks = await asyncio.to_thread(query_guidelines_text, message, top_k=top_k)
+        answer = None if _has_good_evidence(retrieved_chunks) else LOW_EVIDENCE_ANSWER
+
+    if answer is not None:
+        yield "token", answer
+        citations = []
+    else:
+        llm = await asyncio.to_thread(_get_llm)
+        messages = _build_messages(STREAM_SYSTEM_PROMPT, history, retrieved_chunks, message)
+
+        parts = []
+        async for chunk in llm.astream(messages):
+            if chunk.text:
+                parts.append(chunk.text)
+                yield "token", chunk.text
+        answer = "".join(parts)
+        citations = [] if _is_disclaimer(answer) else citations_from_chunks(retrieved_chunks, limit=3)
+
+    _sessions.append(session_id, user_message, ChatMessage(role="assistant", content=answer, citations=citations))
+    yield "done", ChatResponse(session_id=session_id, answer=answer, citations=citations)
+
+
 def get_history(session_id: str) -> list[ChatMessage]:
-    return _sessions.get(session_id, [])
+    return _sessions.get(session_id)
 
 
 def clear_session(session_id: str) -> bool:
-    if session_id in _sessions:
-        del _sessions[session_id]
-        return True
-    return False
+    return _sessions.delete(session_id)
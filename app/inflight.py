@@ -0,0 +1,91 @@
+"""In-flight request coalescing — identical concurrent requests share one computation.
+
+A double-clicked "Assess" button or a Streamlit rerun mid-request sends the same
+body twice, and each copy would otherwise run its own paid Gemini pipeline. The
+first request for a key does the work; requests with the same key that arrive
+while it is running wait for its result instead. Keys are only held while the
+work runs, so a repeated request that arrives later is computed afresh.
+
+All callers run on the server's event loop and nothing awaits between checking
+and registering a key, so the registry needs no lock.
+"""
+
+import asyncio
+import hashlib
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+import orjson
+
+_inflight: dict[str, asyncio.Future] = {}
+
+
+def request_key(kind: str, body: dict) -> str:
+    """Stable digest of a request kind and its JSON body."""
+    payload = orjson.dumps([kind, body], option=orjson.OPT_SORT_KEYS)
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+def _register(key: str, future: asyncio.Future) -> asyncio.Future:
+    _inflight[key] = future
+
+    def release(done: asyncio.Future) -> None:
+        _inflight.pop(key, None)
+        if not done.cancelled():
+            done.exception()  # mark retrieved, so a failure nobody awaited is not logged
+
+    future.add_done_callback(release)
+    return future
+
+
+async def coalesce(key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+    """Return `await compute()`, sharing one call among concurrent callers with the same key.
+
+    The work runs as its own task, so a caller that is cancelled does not cancel
+    it for the others.
+    """
+    future = _inflight.get(key)
+    if future is None:
+        future = _register(key, asyncio.ensure_future(compute()))
+    return await asyncio.shield(future)
+
+
+async def _pump(stream: Callable[[], AsyncIterator[tuple[str, Any]]], events: asyncio.Queue) -> Any:
+    """Run `stream()` to the end, forwarding events to `events`; return the "done" payload.
+
+    A final (None, None) marks the end of the events, however the stream stopped.
+    """
+    try:
+        result, has_result = None, False
+        async for kind, payload in stream():
+            if kind == "done":
+                result, has_result = payload, True
+            else:
+                events.put_nowait((kind, payload))
+        if not has_result:
+            raise RuntimeError("Stream ended without a result")
+        return result
+    finally:
+        events.put_nowait((None, None))
+
+
+async def coalesce_stream(key: str, stream: Callable[[], AsyncIterator[tuple[str, Any]]]):
+    """Like `coalesce` for ("kind", payload) event streams ending in ("done", result).
+
+    The stream runs as its own task and the first caller relays its events, so
+    a first caller that disconnects does not cancel the work for callers that
+    joined meanwhile. Those only receive the final ("done", result) once it is
+    available.
+    """
+    future = _inflight.get(key)
+    if future is not None:
+        yield "done", await asyncio.shield(future)
+        return
+
+    events: asyncio.Queue = asyncio.Queue()
+    future = _register(key, asyncio.ensure_future(_pump(stream, events)))
+    while True:
+        kind, payload = await events.get()
+        if kind is None:
+            break
+        yield kind, payload
+    yield "done", await asyncio.shield(future)
@@ -1,21 +1,93 @@
 """FastAPI service for NG12 Cancer Risk Assessor."""
 
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logging.basicConfig(
+    level=os.environ.get("LOG_LEVEL", "INFO"),
+    format="%(asctime)s %(levelname)s %(name)s %(message)s",
+)
+
+import orjson
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 
-from app.agent import assess_patient
-from app.chat import chat_with_guidelines, get_history, clear_session
+from app.inflight import coalesce, coalesce_stream, request_key
 from app.models import AssessRequest, AssessResponse, ChatRequest, ChatResponse
-from app.tools import get_patient, list_patient_ids
+from app.tools import get_patient, list_patient_ids, list_patients
+
+# app.agent, app.chat and app.rag pull in LangChain, LangGraph and Chroma (well over a
+# second of imports), so they are imported inside the handlers that need them and
+# warmed in the background at startup; /health and /patients answer immediately.
+
+logger = logging.getLogger(__name__)
+
+
+def _warm_imports():
+    import app.agent  # noqa: F401
+    import app.chat  # noqa: F401
+
+
+def _warm_kernels():
+    """Compile the semantic cache's Numba kernel before the first query needs it."""
+    try:
+        from app.semantic_cache import compile_kernels
+
+        compile_kernels()
+    except Exception:
+        logger.warning("Kernel warm-up failed; the kernel will compile on the first query", exc_info=True)
+
+
+async def _warm_vectorstore():
+    """Open (or build) the vector store so no request has to wait for ingestion."""
+    try:
+        from app.rag import _get_collection
+
+        await asyncio.to_thread(_get_collection)
+    except Exception:
+        logger.exception("Vector store warm-up failed; it will be retried on the first query")
+
+
+async def _warm_embeddings():
+    """Build the embeddings client and make one call, so the first query skips client
+    setup and the TLS handshake with Gemini."""
+    if not os.environ.get("GOOGLE_API_KEY"):
+        return
+    try:
+        from app.rag import _get_embeddings
+
+        await asyncio.to_thread(lambda: _get_embeddings().embed_query("warmup"))
+    except Exception:
+        logger.warning("Embeddings warm-up failed; the client will be set up on the first query", exc_info=True)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Run in the background so /health and /patients answer while the PDFs are ingested;
+    # queries that arrive meanwhile wait on the ingest lock instead of starting their own
+    warmups = [
+        asyncio.create_task(asyncio.to_thread(_warm_imports)),
+        asyncio.create_task(asyncio.to_thread(_warm_kernels)),
+        asyncio.create_task(_warm_vectorstore()),
+        asyncio.create_task(_warm_embeddings()),
+    ]
+    yield
+    for task in warmups:
+        task.cancel()
+
 
 app = FastAPI(
     title="NG12 Cancer Risk Assessor",
     description="Clinical Decision Support Agent using NICE NG12 guidelines and Google Gemini",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -27,6 +99,34 @@ app.add_middleware(
 )
 
 
+def _event_stream(stream, failure: str) -> StreamingResponse:
+    """Send the ("kind", payload) pairs of an assessment or chat stream as Server-Sent Events.
+
+    Each frame is `data: {"type": kind, ...}`: "status" and "token" frames carry
+    a "text" field, and the last frame is either "done" with the full response
+    model or "error" with a "detail" message.
+    """
+
+    async def frames():
+        try:
+            async for kind, payload in stream:
+                if kind == "done":
+                    event = {"type": kind, **payload.model_dump()}
+                else:
+                    event = {"type": kind, "text": payload}
+                yield b"data: " + orjson.dumps(event) + b"\n\n"
+        except Exception as e:
+            logger.exception(failure)
+            yield b"data: " + orjson.dumps({"type": "error", "detail": f"{failure}: {str(e)}"}) + b"\n\n"
+
+    # X-Accel-Buffering stops nginx-style proxies from holding frames back
+    return StreamingResponse(
+        frames(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.get("/health")
 def health_check():
     return {"status": "healthy", "service": "ng12-cancer-risk-assessor"}
@@ -37,6 +137,12 @@ def get_patients():
     return {"patient_ids": list_patient_ids()}
 
 
+# Declared before /patients/{patient_id}, which would otherwise match "bulk" as an id
+@app.get("/patients/bulk")
+def get_patients_bulk():
+    return {"patients": [p.model_dump() for p in list_patients()]}
+
+
 @app.get("/patients/{patient_id}")
 def get_patient_detail(patient_id: str):
     try:
@@ -47,32 +153,79 @@ def get_patient_detail(patient_id: str):
 
 
 @app.post("/assess", response_model=AssessResponse)
-def assess(request: AssessRequest):
+async def assess(request: AssessRequest):
     try:
         get_patient(request.patient_id)
     except KeyError:
         raise HTTPException(status_code=404, detail=f"Patient {request.patient_id} not found")
 
+    from app.agent import assess_patient
+
     try:
-        return assess_patient(request.patient_id)
+        return await coalesce(
+            request_key("assess", request.model_dump()),
+            lambda: assess_patient(request.patient_id),
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Assessment failed: {str(e)}")
 
 
+@app.post("/assess/stream")
+async def assess_stream(request: AssessRequest):
+    try:
+        get_patient(request.patient_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Patient {request.patient_id} not found")
+
+    from app.agent import stream_assess_patient
+
+    return _event_stream(
+        coalesce_stream(
+            request_key("assess", request.model_dump()),
+            lambda: stream_assess_patient(request.patient_id),
+        ),
+        failure="Assessment failed",
+    )
+
+
 @app.post("/chat", response_model=ChatResponse)
-def chat(request: ChatRequest):
+async def chat(request: ChatRequest):
+    from app.chat import chat_with_guidelines
+
     try:
-        return chat_with_guidelines(
-            session_id=request.session_id,
-            message=request.message,
-            top_k=request.top_k,
+        return await coalesce(
+            request_key("chat", request.model_dump()),
+            lambda: chat_with_guidelines(
+                session_id=request.session_id,
+                message=request.message,
+                top_k=request.top_k,
+            ),
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Chat failed: {str(e)}")
 
 
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    from app.chat import stream_chat_with_guidelines
+
+    return _event_stream(
+        coalesce_stream(
+            request_key("chat", request.model_dump()),
+            lambda: stream_chat_with_guidelines(
+                session_id=request.session_id,
+                message=request.message,
+                top_k=request.top_k,
+            ),
+        ),
+        failure="Chat failed",
+    )
+
+
 @app.get("/chat/{session_id}/history")
 def chat_history(session_id: str):
+    from app.chat import get_history
+
     history = get_history(session_id)
     if not history:
         raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
@@ -81,6 +234,8 @@ def chat_history(session_id: str):
 
 @app.delete("/chat/{session_id}")
 def delete_chat(session_id: str):
+    from app.chat import clear_session
+
     deleted = clear_session(session_id)
     if not deleted:
         raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
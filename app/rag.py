@@ -1,111 +1,408 @@
 """RAG pipeline — query ChromaDB for relevant NG12 guideline chunks."""
 
+import contextlib
+import functools
+import logging
+import multiprocessing
 import os
 import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 
 import chromadb
+import numpy as np
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 
+from app.models import Citation
+from app.semantic_cache import SemanticCache
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to the in-process lock only
+    fcntl = None
+
 VECTORSTORE_PATH = os.path.join(os.path.dirname(__file__), "..", "vectorstore")
 COLLECTION_NAME = "ng12_guidelines"
 DATA_FOLDER = os.path.join(os.path.dirname(__file__), "..", "data")
+INGEST_LOCK_FILE = ".ingest.lock"
+RRF_K = 60
+QUERY_CACHE_DEPTH = 10  # results fetched per cached query, so any top_k <= 10 can be served from it
+EMBEDDING_CACHE_SIZE = 1024
+SYMPTOM_RESULTS_CACHE_SIZE = 512
+SIMILARITY_THRESHOLD = 1.2  # ChromaDB cosine distance: 0 = identical, 2 = opposite
+
+logger = logging.getLogger(__name__)
 
 _collection = None
+_collection_lock = threading.Lock()
 _embeddings = None
+_embeddings_lock = threading.Lock()
+# Free-text chat queries are matched by embedding similarity. Symptom queries share a long
+# template prefix and differ by a word or two, so a near-duplicate embedding can belong to a
+# different symptom; their results are cached by exact query text instead.
+_query_cache = SemanticCache(threshold=0.95, max_entries=512, ttl_seconds=300)
+_symptom_results: OrderedDict[str, tuple[int, "RagResults"]] = OrderedDict()  # query text -> (depth, chunks), LRU
+_symptom_results_lock = threading.Lock()
+_embedding_cache: OrderedDict[str, np.ndarray] = OrderedDict()  # query text -> float32 embedding, LRU
+_embedding_cache_lock = threading.Lock()
+
+
+@dataclass(frozen=True, eq=False)  # generated __eq__ would compare arrays and raise
+class RagResults:
+    """Retrieved chunks, best match first, stored column-wise.
+
+    A single query's results are in ascending distance; results fused from
+    several queries are in RRF score order instead, so the smallest distance
+    may be on a later row.
+
+    Numeric columns are NumPy arrays so filtering and validation run as single
+    vectorized operations. For existing consumers the results also behave like
+    a sequence of chunk dicts ({"chunk_id", "page", "text", "distance"}):
+    indexing and iteration produce dicts, slicing produces RagResults.
+    """
+
+    chunk_ids: list[str]
+    pages: np.ndarray  # int32
+    texts: list[str]
+    distances: np.ndarray  # float64 cosine distance as returned by Chroma
+
+    @classmethod
+    def from_columns(cls, chunk_ids, pages, texts, distances) -> "RagResults":
+        return cls(
+            chunk_ids=list(chunk_ids),
+            pages=np.asarray(pages, dtype=np.int32),
+            texts=list(texts),
+            distances=np.asarray(distances, dtype=np.float64),
+        )
+
+    @classmethod
+    def from_dicts(cls, chunks: list[dict]) -> "RagResults":
+        return cls.from_columns(
+            [c["chunk_id"] for c in chunks],
+            [c["page"] for c in chunks],
+            [c["text"] for c in chunks],
+            [c["distance"] for c in chunks],
+        )
+
+    def __len__(self) -> int:
+        return len(self.chunk_ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return RagResults(self.chunk_ids[index], self.pages[index], self.texts[index], self.distances[index])
+        return {
+            "chunk_id": self.chunk_ids[index],
+            "page": int(self.pages[index]),
+            "text": self.texts[index],
+            "distance": float(self.distances[index]),
+        }
+
+    def __iter__(self):
+        return iter(self.as_dicts())
+
+    def as_dicts(self) -> list[dict]:
+        """The chunks as plain dicts with Python scalars, e.g. for JSON serialization."""
+        return [
+            {"chunk_id": chunk_id, "page": page, "text": text, "distance": distance}
+            for chunk_id, page, text, distance in zip(
+                self.chunk_ids, self.pages.tolist(), self.texts, self.distances.tolist()
+            )
+        ]
+
+
+def citations_from_chunks(chunks: RagResults, limit: int | None = None) -> list[Citation]:
+    """NG12 PDF citations for the first `limit` chunks, with excerpts cut to 200 characters."""
+    return [
+        Citation(
+            source="NG12 PDF",
+            page=c["page"],
+            chunk_id=c["chunk_id"],
+            excerpt=c["text"][:200] + "..." if len(c["text"]) > 200 else c["text"],
+        )
+        for c in chunks[:limit]
+    ]
 
 
 def _get_embeddings():
+    """Return the process-wide embeddings client, so its HTTP connection pool is reused by every query."""
     global _embeddings
-    if _embeddings is None:
-        _embeddings = GoogleGenerativeAIEmbeddings(
-            model="models/gemini-embedding-001",
-            google_api_key=os.environ.get("GOOGLE_API_KEY"),
-        )
-    return _embeddings
+    if _embeddings is not None:
+        return _embeddings
+
+    with _embeddings_lock:
+        if _embeddings is None:
+            _embeddings = GoogleGenerativeAIEmbeddings(
+                model="models/gemini-embedding-001",
+                google_api_key=os.environ.get("GOOGLE_API_KEY"),
+            )
+        return _embeddings
 
 
 def _auto_ingest_pdfs():
     sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
-    from ingestion.ingest_pdf import extract_pages, chunk_text, create_embeddings, build_vectorstore
+    from ingestion.ingest_pdf import parse_pdf, create_embeddings, build_vectorstore, renumber_chunks
 
     persist_dir = os.path.abspath(VECTORSTORE_PATH)
     data_dir = os.path.abspath(DATA_FOLDER)
 
     pdf_files = [f for f in os.listdir(data_dir) if f.lower().endswith(".pdf")]
     if not pdf_files:
-        print("No PDF files found in data folder.")
+        logger.warning("No PDF files found in data folder %s", data_dir)
         return
 
+    pdf_paths = [os.path.join(data_dir, f) for f in pdf_files]
+    if len(pdf_paths) > 1:
+        # PyMuPDF is not thread-safe, so PDFs are parsed in parallel processes. Spawn
+        # rather than fork, since this runs inside the threaded API server.
+        workers = min(len(pdf_paths), os.cpu_count() or 1)
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        jobs = [executor.submit(parse_pdf, path) for path in pdf_paths]
+    else:
+        executor = None
+        jobs = [functools.partial(parse_pdf, path) for path in pdf_paths]
+
     all_chunks = []
-    for pdf_file in pdf_files:
-        pdf_path = os.path.join(data_dir, pdf_file)
-        print(f"[Ingest] Processing: {pdf_file}")
+    for pdf_file, job in zip(pdf_files, jobs):
+        logger.info("Ingest processing pdf=%s", pdf_file)
         try:
-            pages = extract_pages(pdf_path)
-            chunks = chunk_text(pages)
-            print(f"  {len(pages)} pages, {len(chunks)} chunks")
+            pages, chunks = job.result() if executor else job()
+            logger.info("Ingest parsed pdf=%s pages=%d chunks=%d", pdf_file, len(pages), len(chunks))
             all_chunks.extend(chunks)
-        except Exception as e:
-            print(f"  Error processing {pdf_file}: {e}")
+        except Exception:
+            logger.exception("Ingest failed for pdf=%s", pdf_file)
+    if executor:
+        executor.shutdown()
 
     if all_chunks:
-        print(f"[Ingest] Embedding {len(all_chunks)} chunks...")
+        if len(pdf_paths) > 1:
+            all_chunks = renumber_chunks(all_chunks)
+        logger.info("Ingest embedding chunks=%d", len(all_chunks))
         embeddings = create_embeddings(all_chunks)
         os.makedirs(persist_dir, exist_ok=True)
         build_vectorstore(all_chunks, embeddings, persist_dir)
-        print("[Ingest] Vector store ready.")
+        _query_cache.clear()
+        with _symptom_results_lock:
+            _symptom_results.clear()
+        logger.info("Ingest complete, vector store ready at %s", persist_dir)
+
+
+@contextlib.contextmanager
+def _ingest_lock(persist_dir: str):
+    """Exclusive lock on the vector store directory, shared by every worker process."""
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(persist_dir, INGEST_LOCK_FILE), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _open_collection(persist_dir: str):
+    client = chromadb.PersistentClient(path=persist_dir)
+    try:
+        collection = client.get_collection(COLLECTION_NAME)
+    except Exception:
+        return None
+    return collection if collection.count() > 0 else None
 
 
 def _get_collection():
+    """Return the guideline collection, ingesting the PDFs first if the store is empty.
+
+    Called once at API startup. The thread lock and the file lock ensure only one
+    thread and one worker process ingest; the others wait, then open the result.
+    """
     global _collection
     if _collection is not None:
         return _collection
 
-    persist_dir = os.path.abspath(VECTORSTORE_PATH)
-    os.makedirs(persist_dir, exist_ok=True)
-    client = chromadb.PersistentClient(path=persist_dir)
-
-    try:
-        collection = client.get_collection(COLLECTION_NAME)
-        if collection.count() > 0:
-            _collection = collection
+    with _collection_lock:
+        if _collection is not None:
             return _collection
-        raise ValueError("empty")
-    except (ValueError, Exception):
-        print("[RAG] Vector store empty or missing. Starting ingestion...")
-        _auto_ingest_pdfs()
-        client = chromadb.PersistentClient(path=persist_dir)
-        _collection = client.get_collection(COLLECTION_NAME)
-        print(f"[RAG] Loaded {_collection.count()} chunks.")
+
+        persist_dir = os.path.abspath(VECTORSTORE_PATH)
+        os.makedirs(persist_dir, exist_ok=True)
+
+        with _ingest_lock(persist_dir):
+            collection = _open_collection(persist_dir)
+            if collection is None:
+                logger.info("Vector store empty or missing. Starting ingestion...")
+                _auto_ingest_pdfs()
+                collection = chromadb.PersistentClient(path=persist_dir).get_collection(COLLECTION_NAME)
+                logger.info("Loaded %d chunks.", collection.count())
+
+        _collection = collection
         return _collection
 
 
-def embed_query(query: str) -> list[float]:
-    return _get_embeddings().embed_query(query)
+def _as_vector(embedding: list[float]) -> np.ndarray:
+    """One float32 copy of an API embedding, read-only so it can be shared from the cache."""
+    vector = np.asarray(embedding, dtype=np.float32)
+    vector.flags.writeable = False
+    return vector
+
+
+def _cached_embedding(query: str) -> np.ndarray | None:
+    with _embedding_cache_lock:
+        embedding = _embedding_cache.get(query)
+        if embedding is not None:
+            _embedding_cache.move_to_end(query)
+        return embedding
+
+
+def _cache_embedding(query: str, embedding: np.ndarray) -> None:
+    with _embedding_cache_lock:
+        _embedding_cache[query] = embedding
+        _embedding_cache.move_to_end(query)
+        if len(_embedding_cache) > EMBEDDING_CACHE_SIZE:
+            _embedding_cache.popitem(last=False)
+
+
+def embed_query(query: str) -> np.ndarray:
+    embedding = _cached_embedding(query)
+    if embedding is None:
+        embedding = _as_vector(_get_embeddings().embed_query(query))
+        _cache_embedding(query, embedding)
+    return embedding
+
+
+def embed_queries(queries: list[str]) -> list[np.ndarray]:
+    """Embed several queries, sending only the uncached ones in a single batched request."""
+    embeddings = [_cached_embedding(q) for q in queries]
+    missing = list(dict.fromkeys(q for q, e in zip(queries, embeddings) if e is None))
+    if missing:
+        vectors = _get_embeddings().embed_documents(missing, task_type="RETRIEVAL_QUERY")
+        fetched = {query: _as_vector(vector) for query, vector in zip(missing, vectors)}
+        for query, embedding in fetched.items():
+            _cache_embedding(query, embedding)
+        embeddings = [e if e is not None else fetched[q] for q, e in zip(queries, embeddings)]
+    return embeddings
+
+
+def _cached_symptom_results(query: str) -> tuple[int, RagResults] | None:
+    with _symptom_results_lock:
+        cached = _symptom_results.get(query)
+        if cached is not None:
+            _symptom_results.move_to_end(query)
+        return cached
+
+
+def _cache_symptom_results(query: str, cached: tuple[int, RagResults]) -> None:
+    with _symptom_results_lock:
+        _symptom_results[query] = cached
+        _symptom_results.move_to_end(query)
+        if len(_symptom_results) > SYMPTOM_RESULTS_CACHE_SIZE:
+            _symptom_results.popitem(last=False)
+
 
+def _query(query_embedding: np.ndarray, top_k: int, query_text: str | None = None) -> RagResults:
+    return _query_many([query_embedding], top_k, None if query_text is None else [query_text])[0]
 
-def _query(query_embedding: list[float], top_k: int) -> list[dict]:
+
+def _query_many(
+    query_embeddings: list[np.ndarray], top_k: int, query_texts: list[str] | None = None
+) -> list[RagResults]:
+    """Top-k chunks per embedding; cache misses go to Chroma in one batched query.
+
+    With `query_texts` results are cached by exact query text, otherwise in the
+    similarity cache keyed by embedding.
+    """
+    results: list[RagResults | None] = [None] * len(query_embeddings)
+    misses = []
+    for i, embedding in enumerate(query_embeddings):
+        cached = _cached_symptom_results(query_texts[i]) if query_texts else _query_cache.get(embedding)
+        if cached is not None and cached[0] >= top_k:
+            results[i] = cached[1][:top_k]
+        else:
+            misses.append(i)
+
+    if misses:
+        depth = max(top_k, QUERY_CACHE_DEPTH)
+        fetched = _query_collection([query_embeddings[i] for i in misses], depth)
+        for i, chunks in zip(misses, fetched):
+            if query_texts:
+                _cache_symptom_results(query_texts[i], (depth, chunks))
+            else:
+                _query_cache.put(query_embeddings[i], (depth, chunks))
+            results[i] = chunks[:top_k]
+    return results
+
+
+def _query_collection(query_embeddings: list[np.ndarray], top_k: int) -> list[RagResults]:
+    # A list of float32 vectors is Chroma's own embedding format, so it is passed through unconverted
     collection = _get_collection()
     results = collection.query(
-        query_embeddings=[query_embedding],
+        query_embeddings=query_embeddings,
         n_results=top_k,
         include=["documents", "metadatas", "distances"],
     )
+    # Chroma already answers column-wise, one list per field and query
     return [
-        {
-            "chunk_id": results["ids"][0][i],
-            "page": results["metadatas"][0][i]["page"],
-            "text": results["documents"][0][i],
-            "distance": results["distances"][0][i],
-        }
-        for i in range(len(results["ids"][0]))
+        RagResults.from_columns(ids, [m["page"] for m in metadatas], documents, distances)
+        for ids, metadatas, documents, distances in zip(
+            results["ids"], results["metadatas"], results["documents"], results["distances"]
+        )
     ]
 
 
-def query_guidelines(symptoms: list[str], top_k: int = 5) -> list[dict]:
-    query_text = "Cancer referral guidelines for symptoms: " + ", ".join(symptoms)
-    return _query(embed_query(query_text), top_k)
+def _reciprocal_rank_fusion(ranked_lists: list[RagResults], top_k: int) -> RagResults:
+    """Fuse per-query rankings: score = sum of 1 / (RRF_K + rank) over the lists a chunk appears in.
+
+    Works on the id and distance columns and copies only the winning rows, so no
+    per-chunk dicts are built.
+    """
+    scores: dict[str, float] = {}
+    best: dict[str, tuple[float, int, int]] = {}  # chunk_id -> (min distance, list index, row)
+    for list_index, results in enumerate(ranked_lists):
+        for rank, (chunk_id, distance) in enumerate(zip(results.chunk_ids, results.distances.tolist())):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+            if chunk_id not in best or distance < best[chunk_id][0]:
+                best[chunk_id] = (distance, list_index, rank)
+
+    if top_k == 1 and scores:
+        ranked = [max(scores, key=scores.get)]  # single pass instead of a full sort
+    else:
+        ranked = sorted(scores, key=scores.get, reverse=True)[:top_k]
+
+    rows = [best[chunk_id] for chunk_id in ranked]
+    return RagResults.from_columns(
+        ranked,
+        [ranked_lists[i].pages[row] for _, i, row in rows],
+        [ranked_lists[i].texts[row] for _, i, row in rows],
+        [distance for distance, _, _ in rows],
+    )
+
+
+def _symptom_query(symptoms: str) -> str:
+    return "Cancer referral guidelines for symptoms: " + symptoms
+
+
+def query_guidelines(symptoms: list[str], top_k: int = 5) -> RagResults:
+    """Retrieve chunks for a symptom list.
+
+    Several symptoms are embedded separately (one batched request for those not
+    embedded before), searched in one batched Chroma query and fused with
+    reciprocal rank fusion, so one symptom's guidance is not diluted by
+    averaging it into a single combined query.
+    """
+    if len(symptoms) <= 1:
+        query_text = _symptom_query(", ".join(symptoms))
+        return _query(embed_query(query_text), top_k, query_text)
+
+    queries = [_symptom_query(s) for s in symptoms]
+    return _reciprocal_rank_fusion(_query_many(embed_queries(queries), top_k, queries), top_k)
+
+
+def warm_symptom_embeddings(symptoms: list[str]) -> None:
+    """Embed each symptom's query ahead of time, so a later query_guidelines call
+    for any of these symptoms, alone or combined, only has to search Chroma."""
+    embed_queries([_symptom_query(s) for s in symptoms])
 
 
-def query_guidelines_text(query: str, top_k: int = 5) -> list[dict]:
+def query_guidelines_text(query: str, top_k: int = 5) -> RagResults:
     return _query(embed_query(query), top_k)
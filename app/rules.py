@@ -0,0 +1,86 @@
+"""Deterministic NG12 rules checked before the LLM agent.
+
+Rules live in data/ng12_rules.json as JSON-logic style predicates over a patient
+record, e.g. {"and": [{">=": [{"var": "age"}, 40]}, {"any_symptom": "haemoptysis"}]}.
+They are compiled once into plain Python closures, so checking every rule costs
+microseconds. Only presentations NG12 states unambiguously belong here; anything
+else falls through to the agent.
+"""
+
+import os
+import re
+from collections.abc import Callable
+
+import orjson
+
+from app.models import PatientInfo
+
+RULES_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "ng12_rules.json")
+
+Predicate = Callable[[dict], bool]
+
+_COMPARISONS: dict[str, Callable[[object, object], bool]] = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+}
+
+_rules: list[tuple[dict, Predicate]] | None = None
+
+
+def _compile_operand(expr) -> Callable[[dict], object]:
+    if isinstance(expr, dict) and "var" in expr:
+        name = expr["var"]
+        return lambda facts: facts[name]
+    return lambda facts: expr
+
+
+def compile_predicate(expr: dict) -> Predicate:
+    """Compile one JSON predicate into a closure over the patient facts dict."""
+    if len(expr) != 1:
+        raise ValueError(f"Rule predicate must have exactly one operator: {expr}")
+    op, args = next(iter(expr.items()))
+
+    if op == "and":
+        parts = [compile_predicate(a) for a in args]
+        return lambda facts: all(p(facts) for p in parts)
+    if op == "or":
+        parts = [compile_predicate(a) for a in args]
+        return lambda facts: any(p(facts) for p in parts)
+    if op == "not":
+        inner = compile_predicate(args)
+        return lambda facts: not inner(facts)
+    if op == "any_symptom":
+        pattern = re.compile(args, re.IGNORECASE)
+        return lambda facts: any(pattern.search(s) for s in facts["symptoms"])
+    if op in _COMPARISONS:
+        compare = _COMPARISONS[op]
+        left, right = (_compile_operand(a) for a in args)
+        return lambda facts: compare(left(facts), right(facts))
+    raise ValueError(f"Unknown rule operator: {op}")
+
+
+def _facts(patient: PatientInfo) -> dict:
+    facts = patient.model_dump()
+    facts["symptom_count"] = len(patient.symptoms)
+    return facts
+
+
+def _load_rules() -> list[tuple[dict, Predicate]]:
+    global _rules
+    if _rules is None:
+        with open(os.path.abspath(RULES_PATH), "rb") as f:
+            _rules = [(rule, compile_predicate(rule["when"])) for rule in orjson.loads(f.read())]
+    return _rules
+
+
+def match_rule(patient: PatientInfo) -> dict | None:
+    """Return the first rule that fires for the patient, or None."""
+    facts = _facts(patient)
+    for rule, predicate in _load_rules():
+        if predicate(facts):
+            return rule
+    return None
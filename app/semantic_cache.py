@@ -0,0 +1,166 @@
+"""Semantic cache for RAG retrievals, keyed by query embedding.
+
+Near-duplicate questions ("red flags for lung cancer?" / "lung cancer red flags")
+embed to almost the same vector, so their retrieved chunks can be reused. A lookup
+compares the query with every cached vector in one pass over a contiguous matrix
+and returns the most similar entry if its cosine similarity clears the threshold.
+The cache is small (hundreds of entries), so an exact scan costs microseconds and
+never misses a neighbour the way approximate bucketing can.
+
+Cached vectors are unit-normalized and stored as int8 rows with a float32 scale
+per row (v ~= q8 * scale), a quarter of the memory and bandwidth of float32.
+Similarity is the dot product of the float32 query with each row, times its
+scale; the quantization error (~1e-4 for unit vectors) is far below the gap any
+sensible threshold needs. The query itself is deliberately left in float32:
+quantizing it too and accumulating int8 x int8 products in int32 measured ~3x
+slower in the Numba kernel and ~2x slower in NumPy (which has no integer BLAS),
+and it would double the similarity error. Entries expire `ttl_seconds` after they were stored.
+The scan runs as a compiled, multi-threaded Numba kernel (a requirement of the
+API, compiled at startup through compile_kernels); without Numba, NumPy is used.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+
+def _quantize(v: np.ndarray) -> tuple[np.ndarray, np.float32]:
+    max_abs = float(np.max(np.abs(v)))
+    scale = np.float32(max_abs / 127) if max_abs > 0 else np.float32(1.0)
+    return np.round(v / scale).astype(np.int8), scale
+
+
+def _cos_scan_numpy(matrix: np.ndarray, scales: np.ndarray, n: int, q: np.ndarray) -> np.ndarray:
+    return (matrix[:n] @ q) * scales[:n]
+
+
+if njit is not None:
+    # cache=True stores the compiled kernel in __pycache__, so only the very first
+    # process pays the compile time. Rows are scanned in parallel; calls are
+    # serialized by the cache lock, as Numba's default threading layer requires.
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _cos_scan(matrix, scales, n, q):
+        out = np.empty(n, dtype=np.float32)
+        for i in prange(n):
+            s = np.float32(0.0)
+            for j in range(q.shape[0]):
+                s += matrix[i, j] * q[j]
+            out[i] = s * scales[i]
+        return out
+
+else:
+    _cos_scan = _cos_scan_numpy
+
+
+def compile_kernels() -> None:
+    """Compile the Numba scan for the argument types the cache uses, without running it.
+
+    The API calls this at startup, so the first lookup does not pay the compile
+    time (about a second without an on-disk cache) on a live request. A no-op
+    when Numba is not installed.
+    """
+    if njit is None:
+        return
+    from numba import typeof
+
+    sample = (np.zeros((1, 1), dtype=np.int8), np.zeros(1, dtype=np.float32), 1, np.zeros(1, dtype=np.float32))
+    _cos_scan.compile(tuple(typeof(arg) for arg in sample))
+
+
+class SemanticCache:
+    def __init__(self, threshold: float = 0.95, max_entries: int = 512, ttl_seconds: float | None = 300):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._matrix: np.ndarray | None = None  # (capacity, dim) int8 unit vectors, grown on demand
+        self._scales: np.ndarray | None = None  # (capacity,) float32 dequantization scales, 0 for free rows
+        self._rows_in_use = 0  # high-water mark; rows below it are scanned
+        self._free_rows: list[int] = []
+        self._entries: OrderedDict[int, tuple[float, Any]] = OrderedDict()  # row -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _normalize(self, vector) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm > 0 else v
+
+    def _best_match(self, v: np.ndarray) -> int | None:
+        """Row of the live entry most similar to `v` above the threshold, or None."""
+        if not self._entries:
+            return None
+        sims = _cos_scan(self._matrix, self._scales, self._rows_in_use, v)
+        row = int(np.argmax(sims))
+        if sims[row] < self.threshold or row not in self._entries:
+            return None
+        if self._entries[row][0] < time.monotonic():
+            self._remove(row)
+            return None
+        return row
+
+    def get(self, vector) -> Any | None:
+        """Return the value cached for the most similar vector, or None on a miss."""
+        v = self._normalize(vector)
+        with self._lock:
+            row = self._best_match(v)
+            if row is None:
+                return None
+            self._entries.move_to_end(row)
+            return self._entries[row][1]
+
+    def put(self, vector, value: Any) -> None:
+        """Cache `value` for `vector`, replacing the value of a near-identical entry."""
+        v = self._normalize(vector)
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds is not None else float("inf")
+        with self._lock:
+            row = self._best_match(v)
+            if row is not None:
+                self._entries[row] = (expires_at, value)
+                self._entries.move_to_end(row)
+                return
+
+            if len(self._entries) >= self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+            row = self._allocate_row(v.shape[0])
+            self._matrix[row], self._scales[row] = _quantize(v)
+            self._entries[row] = (expires_at, value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._free_rows.clear()
+            self._rows_in_use = 0
+            self._matrix = None
+            self._scales = None
+
+    def _allocate_row(self, dim: int) -> int:
+        if self._free_rows:
+            return self._free_rows.pop()
+        used = self._rows_in_use
+        if self._matrix is None:
+            capacity = min(64, self.max_entries)
+            self._matrix = np.zeros((capacity, dim), dtype=np.int8)
+            self._scales = np.zeros(capacity, dtype=np.float32)
+        elif used == self._matrix.shape[0]:
+            capacity = min(used * 2, self.max_entries)
+            self._matrix = np.concatenate([self._matrix, np.zeros((capacity - used, dim), dtype=np.int8)])
+            self._scales = np.concatenate([self._scales, np.zeros(capacity - used, dtype=np.float32)])
+        self._rows_in_use += 1
+        return used
+
+    def _remove(self, row: int) -> None:
+        del self._entries[row]
+        self._scales[row] = 0.0  # a zero scale scores 0, below any useful threshold
+        self._free_rows.append(row)
@@ -0,0 +1,90 @@
+"""Chat session storage — bounded in-process LRU, or Redis when REDIS_URL is set."""
+
+import itertools
+import os
+import threading
+from collections import OrderedDict, deque
+
+from app.models import ChatMessage
+
+MAX_SESSIONS = int(os.environ.get("CHAT_MAX_SESSIONS", "10000"))
+MAX_HISTORY_MESSAGES = 50  # per session; older messages are dropped
+SESSION_TTL_SECONDS = 24 * 60 * 60  # Redis only
+REDIS_KEY_PREFIX = "ng12:chat:"
+
+
+class InMemorySessionStore:
+    """LRU of session_id -> recent messages, local to this worker process."""
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS, max_messages: int = MAX_HISTORY_MESSAGES):
+        self.max_sessions = max_sessions
+        self.max_messages = max_messages
+        self._sessions: OrderedDict[str, deque[ChatMessage]] = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, session_id: str, last: int | None = None) -> list[ChatMessage]:
+        """Return the session's messages, oldest first; only the newest `last` if given."""
+        with self._lock:
+            history = self._sessions.get(session_id)
+            if history is None:
+                return []
+            self._sessions.move_to_end(session_id)
+            if last is None or last >= len(history):
+                return list(history)
+            recent = list(itertools.islice(reversed(history), last))
+            recent.reverse()
+            return recent
+
+    def append(self, session_id: str, *messages: ChatMessage) -> None:
+        with self._lock:
+            history = self._sessions.get(session_id)
+            if history is None:
+                history = self._sessions[session_id] = deque(maxlen=self.max_messages)
+                if len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            else:
+                self._sessions.move_to_end(session_id)
+            history.extend(messages)
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+
+class RedisSessionStore:
+    """Redis lists of JSON-encoded messages, shared by every worker."""
+
+    def __init__(self, url: str, max_messages: int = MAX_HISTORY_MESSAGES):
+        import redis
+
+        self.max_messages = max_messages
+        self._redis = redis.Redis.from_url(url)
+
+    def _key(self, session_id: str) -> str:
+        return REDIS_KEY_PREFIX + session_id
+
+    def get(self, session_id: str, last: int | None = None) -> list[ChatMessage]:
+        """Return the session's messages, oldest first; only the newest `last` if given."""
+        if last is not None and last <= 0:
+            return []
+        start = 0 if last is None else -last
+        raw = self._redis.lrange(self._key(session_id), start, -1)
+        return [ChatMessage.model_validate_json(m) for m in raw]
+
+    def append(self, session_id: str, *messages: ChatMessage) -> None:
+        key = self._key(session_id)
+        pipe = self._redis.pipeline()
+        pipe.rpush(key, *(m.model_dump_json() for m in messages))
+        pipe.ltrim(key, -self.max_messages, -1)
+        pipe.expire(key, SESSION_TTL_SECONDS)
+        pipe.execute()
+
+    def delete(self, session_id: str) -> bool:
+        return self._redis.delete(self._key(session_id)) > 0
+
+
+def create_session_store():
+    redis_url = os.environ.get("REDIS_URL")
+    if redis_url:
+        return RedisSessionStore(redis_url)
+    return InMemorySessionStore()
@@ -1,30 +1,52 @@
 """Patient data lookup — simulates a database query."""
 
-import json
+import functools
 import os
 
+import orjson
+
 from app.models import PatientInfo
 
 DATA_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "patients.json")
 
-_patients_cache: dict[str, dict] | None = None
+
+@functools.lru_cache(maxsize=1)
+def _patients() -> dict[str, PatientInfo]:
+    """Parsed patient records, read from disk once per process."""
+    with open(os.path.abspath(DATA_PATH), "rb") as f:
+        patients_list = orjson.loads(f.read())
+    return {p["patient_id"]: PatientInfo(**p) for p in patients_list}
 
 
-def _load_patients() -> dict[str, dict]:
-    global _patients_cache
-    if _patients_cache is None:
-        with open(os.path.abspath(DATA_PATH), "r") as f:
-            patients_list = json.load(f)
-        _patients_cache = {p["patient_id"]: p for p in patients_list}
-    return _patients_cache
+@functools.lru_cache(maxsize=1)
+def _sorted_patient_ids() -> tuple[str, ...]:
+    return tuple(sorted(_patients()))
 
 
 def get_patient(patient_id: str) -> PatientInfo:
-    patients = _load_patients()
-    if patient_id not in patients:
-        raise KeyError(f"Patient {patient_id} not found")
-    return PatientInfo(**patients[patient_id])
+    try:
+        return _patients()[patient_id]
+    except KeyError:
+        raise KeyError(f"Patient {patient_id} not found") from None
+
+
+@functools.lru_cache(maxsize=256)
+def get_patient_json(patient_id: str) -> str:
+    """Serialized patient record, cached because the agent may fetch it several times per run."""
+    return get_patient(patient_id).model_dump_json(indent=2)
+
+
+def reload_patients() -> None:
+    """Drop cached records so the next lookup re-reads patients.json."""
+    _patients.cache_clear()
+    _sorted_patient_ids.cache_clear()
+    get_patient_json.cache_clear()
 
 
 def list_patient_ids() -> list[str]:
-    return sorted(_load_patients().keys())
+    return list(_sorted_patient_ids())
+
+
+def list_patients() -> list[PatientInfo]:
+    patients = _patients()
+    return [patients[patient_id] for patient_id in _sorted_patient_ids()]
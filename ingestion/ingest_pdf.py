@@ -8,6 +8,8 @@ generates embeddings via Google Gemini, and stores in ChromaDB.
 import argparse
 import os
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from dotenv import load_dotenv
 
@@ -30,73 +32,141 @@ VECTORSTORE_PATH = os.path.join(os.path.dirname(__file__), "..", "vectorstore")
 COLLECTION_NAME = "ng12_guidelines"
 CHUNK_SIZE = 500  # approximate tokens (chars / 4)
 CHUNK_OVERLAP = 100
+EMBED_BATCH_SIZE = 100  # Gemini batchEmbedContents limit
+# Chroma HNSW graph: neighbours per node, build-time and query-time candidate list sizes
+HNSW_M = 32
+HNSW_CONSTRUCTION_EF = 200
+HNSW_SEARCH_EF = 64
+EMBED_MAX_WORKERS = 8
+EMBED_MAX_RETRIES = 5
+RETRYABLE_STATUS_CODES = {429, 500, 503}
 
 
 def extract_pages(pdf_path: str) -> list[dict]:
-    """Extract text from each page of the PDF."""
-    doc = fitz.open(pdf_path)
+    """Extract text from each page of the PDF.
+
+    Uses PyMuPDF's block output (faster than plain "text" extraction) and joins
+    text blocks with blank lines, so chunk_text can split on paragraph boundaries.
+    """
     pages = []
-    for page_num in range(len(doc)):
-        page = doc[page_num]
-        text = page.get_text("text")
-        if text.strip():
-            pages.append({"page": page_num + 1, "text": text})
-    doc.close()
+    with fitz.open(pdf_path) as doc:
+        for page_num, page in enumerate(doc, 1):
+            # Block tuples are (x0, y0, x1, y1, text, block_no, block_type); type 1 is an image
+            paragraphs = (b[4].strip() for b in page.get_text("blocks") if b[6] == 0)
+            text = "\n\n".join(p for p in paragraphs if p)
+            if text:
+                pages.append({"page": page_num, "text": text})
     return pages
 
 
+def parse_pdf(pdf_path: str) -> tuple[list[dict], list[dict]]:
+    """Extract and chunk one PDF. Top-level so it can run in a worker process."""
+    pages = extract_pages(pdf_path)
+    return pages, chunk_text(pages)
+
+
+def _chunk_spans(text: str, size: int, overlap: int):
+    """Yield (start, end) offsets of overlapping windows over `text`.
+
+    A window that would cut mid-text is pulled back to the last paragraph break,
+    line break or sentence end in its second half, so chunks follow the document
+    structure. The next window starts `overlap` characters before the previous end.
+    """
+    length = len(text)
+    start = 0
+    while start < length:
+        end = min(start + size, length)
+        if end < length:
+            floor = start + size // 2
+            for sep in ("\n\n", "\n", ". "):
+                cut = text.rfind(sep, floor, end)
+                if cut != -1:
+                    end = cut + len(sep)
+                    break
+        yield start, end
+        if end >= length:
+            break
+        start = max(end - overlap, start + 1)
+
+
+def _chunk_id(page: int, index: int) -> str:
+    return f"ng12_p{page:03d}_c{index:04d}"
+
+
+def renumber_chunks(chunks: list[dict]) -> list[dict]:
+    """Give chunks merged from several PDFs unique ids; each PDF's chunk_text counts from 0."""
+    return [{**c, "chunk_id": _chunk_id(c["page"], i)} for i, c in enumerate(chunks)]
+
+
 def chunk_text(pages: list[dict], chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> list[dict]:
     """Split page text into overlapping chunks, preserving page metadata."""
-    chunks = []
-    chunk_counter = 0
+    # Use character-based chunking (approx 4 chars per token)
+    char_chunk_size = chunk_size * 4
+    char_overlap = overlap * 4
 
+    chunks = []
     for page_data in pages:
         page_num = page_data["page"]
         text = page_data["text"]
-        # Use character-based chunking (approx 4 chars per token)
-        char_chunk_size = chunk_size * 4
-        char_overlap = overlap * 4
 
-        start = 0
-        while start < len(text):
-            end = start + char_chunk_size
-            chunk_text_content = text[start:end]
-
-            if chunk_text_content.strip():
-                chunk_id = f"ng12_p{page_num:03d}_c{chunk_counter:04d}"
+        for start, end in _chunk_spans(text, char_chunk_size, char_overlap):
+            content = text[start:end].strip()
+            if content:
                 chunks.append({
-                    "chunk_id": chunk_id,
+                    "chunk_id": _chunk_id(page_num, len(chunks)),
                     "page": page_num,
-                    "text": chunk_text_content.strip(),
+                    "text": content,
                 })
-                chunk_counter += 1
-
-            start += char_chunk_size - char_overlap
 
     return chunks
 
 
+def _embed_batch(embeddings_model, texts: list[str]) -> list[list[float]]:
+    """Embed one batch, backing off exponentially on rate limits and transient errors."""
+    for attempt in range(EMBED_MAX_RETRIES):
+        try:
+            return embeddings_model.embed_documents(texts, batch_size=len(texts))
+        except Exception as e:
+            # langchain wraps the SDK's ClientError/ServerError, which carries the HTTP status
+            status = getattr(e.__cause__, "code", None)
+            if status not in RETRYABLE_STATUS_CODES or attempt == EMBED_MAX_RETRIES - 1:
+                raise
+            time.sleep(2 ** attempt)
+
+
 def create_embeddings(chunks: list[dict]) -> list[list[float]]:
     """Generate embeddings for chunks using gemini embedding model.
+
+    Identical chunk texts are embedded once, and batches are sent concurrently.
     """
     embeddings_model = GoogleGenerativeAIEmbeddings(
         model="models/gemini-embedding-001",
         google_api_key=os.environ.get("GOOGLE_API_KEY"),
     )
 
-    embeddings = []
-    batch_size = 20
-
-    for i in range(0, len(chunks), batch_size):
-        batch_texts = [c["text"] for c in chunks[i : i + batch_size]]
-        batch_num = i // batch_size + 1
-        total_batches = (len(chunks) + batch_size - 1) // batch_size
-        print(f"  Embedding batch {batch_num}/{total_batches}...")
-
-        batch_embeddings = embeddings_model.embed_documents(batch_texts)
-        embeddings.extend(batch_embeddings)
-
-    return embeddings
+    unique_texts = list(dict.fromkeys(c["text"] for c in chunks))
+    batches = [
+        unique_texts[i : i + EMBED_BATCH_SIZE]
+        for i in range(0, len(unique_texts), EMBED_BATCH_SIZE)
+    ]
+    print(f"  Embedding {len(unique_texts)} unique chunks in {len(batches)} batches...")
+
+    results: list[list[list[float]] | None] = [None] * len(batches)
+    with ThreadPoolExecutor(max_workers=EMBED_MAX_WORKERS) as executor:
+        futures = {
+            executor.submit(_embed_batch, embeddings_model, batch): idx
+            for idx, batch in enumerate(batches)
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            results[futures[future]] = future.result()
+            print(f"  Embedded batch {done}/{len(batches)}")
+
+    by_text = {
+        text: vector
+        for batch, vectors in zip(batches, results)
+        for text, vector in zip(batch, vectors)
+    }
+    return [by_text[c["text"]] for c in chunks]
 
 
 def build_vectorstore(chunks: list[dict], embeddings: list[list[float]], persist_dir: str):
@@ -111,7 +181,12 @@ def build_vectorstore(chunks: list[dict], embeddings: list[list[float]], persist
 
     collection = client.create_collection(
         name=COLLECTION_NAME,
-        metadata={"hnsw:space": "cosine"},
+        metadata={
+            "hnsw:space": "cosine",
+            "hnsw:M": HNSW_M,
+            "hnsw:construction_ef": HNSW_CONSTRUCTION_EF,
+            "hnsw:search_ef": HNSW_SEARCH_EF,
+        },
     )
 
     collection.add(
@@ -0,0 +1,118 @@
+"""Tests for the assessment agent's streaming loop, with a scripted agent (no API calls)."""
+
+import asyncio
+import threading
+
+import pytest
+from langchain_core.messages import AIMessage, ToolMessage
+
+from app import agent
+from app.rag import RagResults
+from app.tools import get_patient
+
+
+class FailingAgent:
+    async def astream(self, inputs, stream_mode):
+        raise RuntimeError("model unavailable")
+        yield
+
+
+class FakeAgent:
+    def __init__(self, final_text):
+        self.final_text = final_text
+
+    async def astream(self, inputs, stream_mode):
+        assert stream_mode == "updates"
+        yield {"agent": {"messages": [AIMessage(content="", tool_calls=[
+            {"name": "get_patient_data", "args": {"patient_id": "PT-101"}, "id": "1"},
+        ])]}}
+        yield {"tools": {"messages": [ToolMessage(content="{}", tool_call_id="1")]}}
+        yield {"agent": {"messages": [AIMessage(content="", tool_calls=[
+            {"name": "search_guidelines", "args": {"symptoms": ["hemoptysis"]}, "id": "2"},
+        ])]}}
+        yield {"tools": {"messages": [ToolMessage(content="[]", tool_call_id="2")]}}
+        yield {"agent": {"messages": [AIMessage(content=self.final_text)]}}
+
+
+def _collect(patient_id):
+    async def run():
+        return [event async for event in agent.stream_assess_patient(patient_id)]
+
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def scripted_agent(monkeypatch):
+    def install(final_text):
+        monkeypatch.setattr(agent, "RULES_ENABLED", False)
+        monkeypatch.setattr(agent, "_get_agent", lambda: FakeAgent(final_text))
+        monkeypatch.setattr(agent, "query_guidelines", lambda symptoms, top_k: [])
+        monkeypatch.setattr(agent, "warm_symptom_embeddings", lambda symptoms: None)
+
+    return install
+
+
+class TestStreamAssessPatient:
+    def test_reports_tool_calls_then_result(self, scripted_agent):
+        scripted_agent('{"risk_level": "Urgent Referral (2-week wait)", "assessment": "ok", "citations": []}')
+        events = _collect("PT-101")
+        assert events[:-1] == [
+            ("status", agent.TOOL_STATUS["get_patient_data"]),
+            ("status", agent.TOOL_STATUS["search_guidelines"]),
+        ]
+        kind, response = events[-1]
+        assert kind == "done"
+        assert response.patient_id == "PT-101"
+        assert response.risk_level == "Urgent Referral (2-week wait)"
+
+    def test_assess_patient_returns_final_response(self, scripted_agent):
+        scripted_agent("not json")
+        response = asyncio.run(agent.assess_patient("PT-101"))
+        assert response.risk_level == "Assessment Error"
+
+    def test_prefetch_is_cancelled_when_the_agent_fails(self, monkeypatch):
+        release = threading.Event()
+        monkeypatch.setattr(agent, "RULES_ENABLED", False)
+        monkeypatch.setattr(agent, "_get_agent", lambda: FailingAgent())
+        monkeypatch.setattr(agent, "warm_symptom_embeddings", lambda symptoms: release.wait(5))
+
+        async def run():
+            with pytest.raises(RuntimeError, match="model unavailable"):
+                async for _ in agent.stream_assess_patient("PT-101"):
+                    pass
+            await asyncio.sleep(0)
+            pending = [t for t in asyncio.all_tasks() if t is not asyncio.current_task() and not t.done()]
+            release.set()
+            return pending
+
+        assert asyncio.run(run()) == []
+
+
+class TestAssessByRule:
+    RULE = {
+        "risk_level": "Urgent Referral (2-week wait)",
+        "assessment": "{name} is aged {age}.",
+        "citation_query": "lung cancer haemoptysis",
+    }
+
+    def _chunks(self, distance):
+        return RagResults.from_dicts([{"chunk_id": "ng12_p009_c0042", "page": 9, "text": "Refer people.", "distance": distance}])
+
+    def test_cites_relevant_chunk(self, monkeypatch):
+        monkeypatch.setattr(agent, "query_guidelines", lambda symptoms, top_k: self._chunks(0.4))
+        response = agent._assess_by_rule(get_patient("PT-101"), self.RULE)
+        assert response.assessment == "John Doe is aged 55."
+        assert [c.chunk_id for c in response.citations] == ["ng12_p009_c0042"]
+
+    def test_drops_citation_above_similarity_threshold(self, monkeypatch):
+        monkeypatch.setattr(agent, "query_guidelines", lambda symptoms, top_k: self._chunks(agent.SIMILARITY_THRESHOLD))
+        assert agent._assess_by_rule(get_patient("PT-101"), self.RULE).citations == []
+
+    def test_retrieval_failure_keeps_the_rule_answer(self, monkeypatch):
+        def fail(symptoms, top_k):
+            raise ConnectionError("vector store unavailable")
+
+        monkeypatch.setattr(agent, "query_guidelines", fail)
+        response = agent._assess_by_rule(get_patient("PT-101"), self.RULE)
+        assert response.risk_level == "Urgent Referral (2-week wait)"
+        assert response.citations == []
@@ -1,6 +1,9 @@
 """Integration tests for FastAPI endpoints."""
 
+import json
 import os
+import subprocess
+import sys
 
 import pytest
 
@@ -13,6 +16,19 @@ class TestHealthEndpoint:
         assert data["status"] == "healthy"
 
 
+class TestColdStart:
+    def test_main_does_not_import_agent_stack(self):
+        code = "import sys, app.main; print(sorted(m for m in ('app.agent', 'app.chat', 'app.rag') if m in sys.modules))"
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=os.path.join(os.path.dirname(__file__), ".."),
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        assert result.stdout.strip() == "[]"
+
+
 class TestPatientsEndpoint:
     def test_list_patients(self, client):
         response = client.get("/patients")
@@ -28,6 +44,13 @@ class TestPatientsEndpoint:
         assert data["patient_id"] == "PT-101"
         assert data["name"] == "John Doe"
 
+    def test_bulk_returns_all_patients(self, client):
+        response = client.get("/patients/bulk")
+        assert response.status_code == 200
+        patients = response.json()["patients"]
+        assert [p["patient_id"] for p in patients] == client.get("/patients").json()["patient_ids"]
+        assert patients[0] == client.get(f"/patients/{patients[0]['patient_id']}").json()
+
     def test_get_invalid_patient(self, client):
         response = client.get("/patients/PT-999")
         assert response.status_code == 404
@@ -38,6 +61,10 @@ class TestAssessEndpoint:
         response = client.post("/assess", json={"patient_id": "PT-999"})
         assert response.status_code == 404
 
+    def test_stream_invalid_patient_returns_404(self, client):
+        response = client.post("/assess/stream", json={"patient_id": "PT-999"})
+        assert response.status_code == 404
+
     def test_missing_patient_id_returns_422(self, client):
         response = client.post("/assess", json={})
         assert response.status_code == 422
@@ -50,7 +77,11 @@ class TestAssessEndpoint:
         not os.path.exists(os.path.join(os.path.dirname(__file__), "..", "vectorstore")),
         reason="Vector store not built",
     )
-    def test_assess_valid_patient(self, client):
+    def test_assess_valid_patient(self, client, monkeypatch):
+        from app import agent
+
+        # Same as ASSESS_RULES_ENABLED=0: keep the agent path covered even if a rule would answer PT-101
+        monkeypatch.setattr(agent, "RULES_ENABLED", False)
         response = client.post("/assess", json={"patient_id": "PT-101"})
         assert response.status_code == 200
         data = response.json()
@@ -78,3 +109,36 @@ class TestAssessEndpoint:
             assert "page" in citation
             assert "chunk_id" in citation
             assert "excerpt" in citation
+
+
+class TestChatEndpoint:
+    def test_greeting_skips_retrieval(self, client):
+        response = client.post("/chat", json={"session_id": "test-greeting", "message": "hello"})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["session_id"] == "test-greeting"
+        assert data["citations"] == []
+
+    def test_history_and_delete(self, client):
+        client.post("/chat", json={"session_id": "test-history", "message": "hi"})
+        response = client.get("/chat/test-history/history")
+        assert response.status_code == 200
+        roles = [m["role"] for m in response.json()["messages"]]
+        assert roles == ["user", "assistant"]
+
+        assert client.delete("/chat/test-history").status_code == 200
+        assert client.get("/chat/test-history/history").status_code == 404
+
+    def test_stream_greeting(self, client):
+        response = client.post("/chat/stream", json={"session_id": "test-stream", "message": "hello"})
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = [json.loads(line[len("data: "):]) for line in response.text.splitlines() if line]
+        assert [e["type"] for e in events] == ["token", "done"]
+        assert events[-1]["answer"] == events[0]["text"]
+        assert events[-1]["citations"] == []
+        assert client.get("/chat/test-stream/history").status_code == 200
+
+    def test_missing_message_returns_422(self, client):
+        response = client.post("/chat", json={"session_id": "test-422"})
+        assert response.status_code == 422
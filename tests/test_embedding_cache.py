@@ -0,0 +1,113 @@
+"""Tests for the embeddings client and the query caches in the RAG pipeline (no API calls)."""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from app import rag
+
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.calls = []
+
+    def embed_query(self, text):
+        self.calls.append([text])
+        return [float(len(text)), 1.0]
+
+    def embed_documents(self, texts, task_type=None):
+        self.calls.append(list(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+
+
+@pytest.fixture
+def fake_embeddings(monkeypatch):
+    fake = FakeEmbeddings()
+    monkeypatch.setattr(rag, "_get_embeddings", lambda: fake)
+    monkeypatch.setattr(rag, "_embedding_cache", type(rag._embedding_cache)())
+    return fake
+
+
+@pytest.fixture
+def fake_collection(monkeypatch):
+    """Chroma stand-in: each query's single result is a chunk tagged with its call number."""
+    calls = []
+
+    def query_collection(query_embeddings, top_k):
+        calls.append(len(query_embeddings))
+        return [
+            rag.RagResults.from_dicts([{"chunk_id": f"call{len(calls)}_q{i}", "page": 1, "text": "", "distance": 0.1}])
+            for i in range(len(query_embeddings))
+        ]
+
+    monkeypatch.setattr(rag, "_query_collection", query_collection)
+    monkeypatch.setattr(rag, "_query_cache", rag.SemanticCache(threshold=0.95))
+    monkeypatch.setattr(rag, "_symptom_results", type(rag._symptom_results)())
+    return calls
+
+
+class TestEmbedQueries:
+    def test_batches_misses_in_one_request(self, fake_embeddings):
+        result = rag.embed_queries(["cough", "hemoptysis", "cough"])
+        assert fake_embeddings.calls == [["cough", "hemoptysis"]]
+        assert [e.tolist() for e in result] == [[5.0, 1.0], [10.0, 1.0], [5.0, 1.0]]
+        assert all(e.dtype == np.float32 for e in result)
+        assert result[0] is result[2]
+
+    def test_only_uncached_terms_are_embedded(self, fake_embeddings):
+        rag.embed_query("cough")
+        rag.embed_queries(["cough", "breast lump"])
+        assert fake_embeddings.calls == [["cough"], ["breast lump"]]
+
+    def test_cached_vector_is_shared_and_read_only(self, fake_embeddings):
+        first = rag.embed_query("cough")
+        assert rag.embed_query("cough") is first
+        assert not first.flags.writeable
+
+    def test_fully_cached_batch_makes_no_request(self, fake_embeddings):
+        rag.embed_queries(["cough", "haematuria"])
+        rag.embed_queries(["haematuria", "cough"])
+        assert len(fake_embeddings.calls) == 1
+
+    def test_cache_is_bounded(self, fake_embeddings, monkeypatch):
+        monkeypatch.setattr(rag, "EMBEDDING_CACHE_SIZE", 2)
+        rag.embed_queries(["a", "bb", "ccc"])
+        assert list(rag._embedding_cache) == ["bb", "ccc"]
+
+
+class TestEmbeddingsClient:
+    def test_client_is_shared_across_threads(self, monkeypatch):
+        created = []
+
+        def fake_client(**kwargs):
+            created.append(kwargs)
+            return object()
+
+        monkeypatch.setattr(rag, "_embeddings", None)
+        monkeypatch.setattr(rag, "GoogleGenerativeAIEmbeddings", fake_client)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            clients = set(pool.map(lambda _: id(rag._get_embeddings()), range(32)))
+        assert len(created) == 1
+        assert len(clients) == 1
+
+
+class TestQueryResultCaches:
+    # FakeEmbeddings embeds by text length, so equal-length texts get identical vectors
+
+    def test_symptom_queries_are_keyed_by_exact_text(self, fake_embeddings, fake_collection):
+        cough = rag.query_guidelines(["cough"], top_k=1)
+        fever = rag.query_guidelines(["fever"], top_k=1)
+        assert cough.chunk_ids != fever.chunk_ids
+        assert rag.query_guidelines(["cough"], top_k=1).chunk_ids == cough.chunk_ids
+        assert fake_collection == [1, 1]
+
+    def test_multi_symptom_search_reuses_per_symptom_results(self, fake_embeddings, fake_collection):
+        rag.query_guidelines(["cough", "ache"], top_k=1)
+        rag.query_guidelines(["ache", "cough"], top_k=1)
+        assert fake_collection == [2]
+
+    def test_free_text_uses_similarity_cache(self, fake_embeddings, fake_collection):
+        first = rag.query_guidelines_text("lung red flags", top_k=1)
+        assert rag.query_guidelines_text("red flags lung", top_k=1).chunk_ids == first.chunk_ids
+        assert fake_collection == [1]
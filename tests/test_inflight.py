@@ -0,0 +1,123 @@
+"""Tests for in-flight request coalescing."""
+
+import asyncio
+
+from app import inflight
+from app.inflight import coalesce, coalesce_stream, request_key
+
+
+class TestRequestKey:
+    def test_key_ignores_field_order(self):
+        assert request_key("chat", {"a": 1, "b": 2}) == request_key("chat", {"b": 2, "a": 1})
+
+    def test_kind_is_part_of_key(self):
+        assert request_key("chat", {"a": 1}) != request_key("assess", {"a": 1})
+
+
+class TestCoalesce:
+    def test_concurrent_calls_share_one_computation(self):
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "result"
+
+        async def run():
+            return await asyncio.gather(*(coalesce("k", compute) for _ in range(5)))
+
+        assert asyncio.run(run()) == ["result"] * 5
+        assert len(calls) == 1
+        assert inflight._inflight == {}
+
+    def test_sequential_calls_recompute(self):
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            return len(calls)
+
+        async def run():
+            return [await coalesce("k", compute), await coalesce("k", compute)]
+
+        assert asyncio.run(run()) == [1, 2]
+
+    def test_errors_reach_every_caller(self):
+        async def compute():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        async def run():
+            return await asyncio.gather(coalesce("k", compute), coalesce("k", compute), return_exceptions=True)
+
+        results = asyncio.run(run())
+        assert all(isinstance(r, ValueError) for r in results)
+
+
+class TestCoalesceStream:
+    def test_followers_receive_only_the_result(self):
+        calls = []
+
+        async def stream():
+            calls.append(1)
+            yield "token", "a"
+            await asyncio.sleep(0.01)
+            yield "token", "b"
+            yield "done", "ab"
+
+        async def collect():
+            return [event async for event in coalesce_stream("k", stream)]
+
+        async def run():
+            leader = asyncio.create_task(collect())
+            await asyncio.sleep(0)
+            follower = asyncio.create_task(collect())
+            return await leader, await follower
+
+        leader, follower = asyncio.run(run())
+        assert leader == [("token", "a"), ("token", "b"), ("done", "ab")]
+        assert follower == [("done", "ab")]
+        assert len(calls) == 1
+        assert inflight._inflight == {}
+
+    def test_leader_failure_reaches_followers(self):
+        async def stream():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+            yield
+
+        async def collect():
+            return [event async for event in coalesce_stream("k", stream)]
+
+        async def run():
+            leader = asyncio.create_task(collect())
+            await asyncio.sleep(0)
+            follower = asyncio.create_task(collect())
+            return await asyncio.gather(leader, follower, return_exceptions=True)
+
+        results = asyncio.run(run())
+        assert all(isinstance(r, ValueError) for r in results)
+
+    def test_leader_disconnect_does_not_cancel_the_work(self):
+        calls = []
+
+        async def stream():
+            calls.append(1)
+            yield "token", "a"
+            await asyncio.sleep(0.01)
+            yield "done", "ab"
+
+        async def collect():
+            return [event async for event in coalesce_stream("k", stream)]
+
+        async def run():
+            leader = coalesce_stream("k", stream)
+            assert await leader.__anext__() == ("token", "a")
+            follower = asyncio.create_task(collect())
+            await asyncio.sleep(0)
+            await leader.aclose()
+            return await follower
+
+        assert asyncio.run(run()) == [("done", "ab")]
+        assert len(calls) == 1
+        assert inflight._inflight == {}
@@ -0,0 +1,94 @@
+"""Tests for PDF text chunking in the ingestion script (no API calls)."""
+
+import pytest
+
+from ingestion.ingest_pdf import _chunk_spans, chunk_text
+
+
+def spans(text, size=100, overlap=20):
+    return list(_chunk_spans(text, size, overlap))
+
+
+class TestChunkSpans:
+    def test_short_text_is_one_span(self):
+        assert spans("short text") == [(0, 10)]
+
+    def test_empty_text_has_no_spans(self):
+        assert spans("") == []
+
+    @pytest.mark.parametrize("sep", ["\n\n", "\n", ". "])
+    def test_cut_rewinds_to_separator_in_second_half(self, sep):
+        text = "a" * 70 + sep + "b" * 100
+        assert spans(text)[0] == (0, 70 + len(sep))
+
+    def test_paragraph_break_preferred_over_later_sentence_end(self):
+        text = "a" * 60 + "\n\n" + "b" * 20 + ". " + "c" * 100
+        assert spans(text)[0] == (0, 62)
+
+    def test_separator_in_first_half_is_ignored(self):
+        text = "a" * 30 + "\n\n" + "b" * 200
+        assert spans(text)[0] == (0, 100)
+
+    def test_next_span_starts_overlap_before_previous_end(self):
+        result = spans("x" * 250)
+        assert result == [(0, 100), (80, 180), (160, 250)]
+
+    def test_progress_when_overlap_exceeds_cut(self):
+        # the first cut lands at 52, so end - overlap falls before the window start and start + 1 must apply
+        text = ("a" * 50 + ". ") * 10
+        result = spans(text, size=100, overlap=90)
+        starts = [s for s, _ in result]
+        assert starts == sorted(set(starts))
+        assert result[-1][1] == len(text)
+
+    def test_no_tail_span_inside_the_previous_one(self):
+        for length in range(1, 400):
+            result = spans("y" * length)
+            assert all(b_end > a_end for (_, a_end), (_, b_end) in zip(result, result[1:]))
+
+    def test_spans_cover_the_whole_text(self):
+        text = "".join(f"Sentence {i} about referral. " + ("\n\n" if i % 5 == 0 else "") for i in range(200))
+        result = spans(text, size=300, overlap=60)
+        assert result[0][0] == 0
+        assert result[-1][1] == len(text)
+        assert all(b_start <= a_end for (_, a_end), (b_start, _) in zip(result, result[1:]))
+
+
+class TestChunkText:
+    def test_chunks_keep_page_metadata_and_unique_ids(self):
+        pages = [{"page": 1, "text": "First page. " * 300}, {"page": 2, "text": "Second page."}]
+        chunks = chunk_text(pages, chunk_size=100, overlap=20)
+        assert [c["page"] for c in chunks].count(2) == 1
+        assert len({c["chunk_id"] for c in chunks}) == len(chunks)
+        assert chunks[-1] == {"chunk_id": f"ng12_p002_c{len(chunks) - 1:04d}", "page": 2, "text": "Second page."}
+
+    def test_whitespace_only_chunks_are_dropped(self):
+        assert chunk_text([{"page": 1, "text": "   \n\n  "}]) == []
+
+
+class TestMultiPdfIngest:
+    def test_two_pdfs_ingest_with_unique_chunk_ids(self, tmp_path, monkeypatch):
+        import chromadb
+        import fitz
+
+        from app import rag
+        from ingestion import ingest_pdf
+
+        data_dir = tmp_path / "data"
+        data_dir.mkdir()
+        for name in ("a.pdf", "b.pdf"):
+            with fitz.open() as doc:
+                doc.new_page().insert_text((72, 72), f"Guideline text from {name}.")
+                doc.save(data_dir / name)
+
+        persist_dir = tmp_path / "vectorstore"
+        monkeypatch.setattr(rag, "DATA_FOLDER", str(data_dir))
+        monkeypatch.setattr(rag, "VECTORSTORE_PATH", str(persist_dir))
+        monkeypatch.setattr(ingest_pdf, "create_embeddings", lambda chunks: [[1.0, float(i)] for i in range(len(chunks))])
+
+        rag._auto_ingest_pdfs()
+
+        collection = chromadb.PersistentClient(path=str(persist_dir)).get_collection(ingest_pdf.COLLECTION_NAME)
+        stored = collection.get()
+        assert sorted(stored["ids"]) == ["ng12_p001_c0000", "ng12_p001_c0001"]
+        assert {d.split()[-1] for d in stored["documents"]} == {"a.pdf.", "b.pdf."}
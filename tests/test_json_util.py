@@ -0,0 +1,30 @@
+"""Tests for LLM response JSON extraction."""
+
+import orjson
+import pytest
+
+from app._json_util import parse_json
+
+
+class TestParseJson:
+    def test_plain_json(self):
+        assert parse_json('{"answer": "ok", "citations": []}') == {"answer": "ok", "citations": []}
+
+    def test_json_fence(self):
+        raw = 'Here you go:\n```json\n{"risk_level": "Urgent Investigation"}\n```\nDone.'
+        assert parse_json(raw) == {"risk_level": "Urgent Investigation"}
+
+    def test_bare_fence(self):
+        assert parse_json('```\n{"answer": "ok"}\n```') == {"answer": "ok"}
+
+    def test_text_around_json(self):
+        raw = 'Based on NG12: {"answer": "refer", "citations": [{"page": 3}]} hope this helps'
+        assert parse_json(raw) == {"answer": "refer", "citations": [{"page": 3}]}
+
+    def test_nested_objects_in_fence(self):
+        raw = '```json\n{"citations": [{"page": 1}, {"page": 2}]}\n```'
+        assert parse_json(raw)["citations"] == [{"page": 1}, {"page": 2}]
+
+    def test_invalid_raises(self):
+        with pytest.raises(orjson.JSONDecodeError):
+            parse_json("I couldn't find clear support in the NG12 guidelines.")
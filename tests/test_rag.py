@@ -6,6 +6,7 @@ They also require GOOGLE_API_KEY to be set for embedding queries.
 
 import os
 
+import numpy as np
 import pytest
 
 # Skip all tests in this module if vectorstore doesn't exist or API key not set
@@ -21,15 +22,22 @@ pytestmark = [
 ]
 
 
+@pytest.fixture(scope="session")
+def query_guidelines():
+    # Imported and warmed once per session, and only when the skip conditions above pass
+    from app.rag import _get_collection, query_guidelines
+
+    _get_collection()
+    return query_guidelines
+
+
 class TestQueryGuidelines:
-    def test_returns_results(self):
-        from app.rag import query_guidelines
+    def test_returns_results(self, query_guidelines):
         results = query_guidelines(["hemoptysis"], top_k=3)
         assert len(results) > 0
         assert len(results) <= 3
 
-    def test_result_has_required_fields(self):
-        from app.rag import query_guidelines
+    def test_result_has_required_fields(self, query_guidelines):
         results = query_guidelines(["cough"], top_k=1)
         assert len(results) == 1
         chunk = results[0]
@@ -38,25 +46,18 @@ class TestQueryGuidelines:
         assert "text" in chunk
         assert "distance" in chunk
 
-    def test_page_is_positive_int(self):
-        from app.rag import query_guidelines
+    def test_page_is_positive_int(self, query_guidelines):
         results = query_guidelines(["breast lump"], top_k=3)
-        for chunk in results:
-            assert isinstance(chunk["page"], int)
-            assert chunk["page"] > 0
+        assert results.pages.dtype.kind == "i"
+        assert (results.pages > 0).all()
 
-    def test_chunk_id_format(self):
-        from app.rag import query_guidelines
+    def test_chunk_id_format(self, query_guidelines):
         results = query_guidelines(["haematuria"], top_k=3)
-        for chunk in results:
-            assert chunk["chunk_id"].startswith("ng12_p")
+        assert np.char.startswith(np.array(results.chunk_ids, dtype=str), "ng12_p").all()
 
-    def test_different_symptoms_return_different_results(self):
-        from app.rag import query_guidelines
+    def test_different_symptoms_return_different_results(self, query_guidelines):
         lung_results = query_guidelines(["hemoptysis", "cough"], top_k=3)
         breast_results = query_guidelines(["breast lump"], top_k=3)
 
-        lung_ids = {r["chunk_id"] for r in lung_results}
-        breast_ids = {r["chunk_id"] for r in breast_results}
         # At least some results should differ
-        assert lung_ids != breast_ids
+        assert np.setxor1d(lung_results.chunk_ids, breast_results.chunk_ids).size > 0
@@ -0,0 +1,82 @@
+"""Tests for the column-wise RAG result container (no API calls)."""
+
+import orjson
+
+from app.rag import RagResults, _reciprocal_rank_fusion
+
+
+def _results(ids, distances) -> RagResults:
+    return RagResults.from_columns(
+        ids,
+        [int(i.split("_")[1][1:]) for i in ids],
+        [f"text of {i}" for i in ids],
+        distances,
+    )
+
+
+class TestRagResults:
+    def test_columns_are_typed_arrays(self):
+        results = _results(["ng12_p3_c0", "ng12_p7_c1"], [0.1, 0.4])
+        assert results.pages.dtype.kind == "i"
+        assert results.distances.dtype.kind == "f"
+        assert (results.pages > 0).all()
+
+    def test_behaves_like_list_of_dicts(self):
+        results = _results(["ng12_p3_c0", "ng12_p7_c1"], [0.1, 0.4])
+        assert len(results) == 2
+        assert results[0]["chunk_id"] == "ng12_p3_c0"
+        assert isinstance(results[1]["page"], int)
+        assert [c["page"] for c in results] == [3, 7]
+
+    def test_slice_returns_results(self):
+        results = _results(["ng12_p3_c0", "ng12_p7_c1", "ng12_p9_c2"], [0.1, 0.4, 0.5])
+        head = results[:2]
+        assert isinstance(head, RagResults)
+        assert head.chunk_ids == ["ng12_p3_c0", "ng12_p7_c1"]
+
+    def test_as_dicts_is_json_serializable(self):
+        results = _results(["ng12_p3_c0"], [0.25])
+        assert orjson.loads(orjson.dumps(results.as_dicts())) == [
+            {"chunk_id": "ng12_p3_c0", "page": 3, "text": "text of ng12_p3_c0", "distance": 0.25}
+        ]
+
+    def test_round_trip_through_dicts(self):
+        results = _results(["ng12_p3_c0", "ng12_p7_c1"], [0.1, 0.4])
+        assert RagResults.from_dicts(results.as_dicts()).as_dicts() == results.as_dicts()
+
+    def test_comparison_and_hash_do_not_raise(self):
+        results = _results(["ng12_p3_c0", "ng12_p7_c1"], [0.1, 0.4])
+        other = RagResults.from_dicts(results.as_dicts())
+        assert results == results
+        assert results != other
+        assert len({results, other}) == 2
+
+
+class TestReciprocalRankFusion:
+    def test_shared_chunk_ranks_first_with_min_distance(self):
+        a = _results(["ng12_p1_c0", "ng12_p2_c1"], [0.2, 0.3])
+        b = _results(["ng12_p2_c1", "ng12_p5_c2"], [0.1, 0.6])
+        fused = _reciprocal_rank_fusion([a, b], top_k=2)
+        assert isinstance(fused, RagResults)
+        assert fused.chunk_ids[0] == "ng12_p2_c1"
+        assert fused[0]["distance"] == 0.1
+        assert len(fused) == 2
+
+    def test_top_1_matches_head_of_full_fusion(self):
+        a = _results(["ng12_p1_c0", "ng12_p2_c1", "ng12_p3_c2"], [0.2, 0.3, 0.5])
+        b = _results(["ng12_p3_c2", "ng12_p1_c0"], [0.1, 0.6])
+        top_1 = _reciprocal_rank_fusion([a, b], top_k=1)
+        assert top_1.as_dicts() == _reciprocal_rank_fusion([a, b], top_k=3)[:1].as_dicts()
+
+    def test_empty_lists(self):
+        assert len(_reciprocal_rank_fusion([_results([], []), _results([], [])], top_k=1)) == 0
+
+    def test_fused_rows_follow_rrf_score_not_distance(self):
+        from app.chat import _has_good_evidence
+
+        a = _results(["ng12_p1_c0", "ng12_p2_c1"], [1.3, 1.4])
+        b = _results(["ng12_p1_c0", "ng12_p3_c2"], [1.5, 0.2])
+        fused = _reciprocal_rank_fusion([a, b], top_k=3)
+        assert fused.chunk_ids[0] == "ng12_p1_c0"
+        assert fused.distances[0] > fused.distances.min()
+        assert _has_good_evidence(fused)
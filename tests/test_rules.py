@@ -0,0 +1,63 @@
+"""Tests for the deterministic NG12 rule pre-filter."""
+
+import pytest
+
+from app.models import PatientInfo
+from app.rules import compile_predicate, match_rule
+from app.tools import get_patient
+
+
+def _patient(**overrides) -> PatientInfo:
+    fields = {
+        "patient_id": "PT-TEST",
+        "name": "Test Patient",
+        "age": 50,
+        "gender": "Female",
+        "smoking_history": "Never Smoked",
+        "symptoms": ["fatigue"],
+        "symptom_duration_days": 10,
+    }
+    fields.update(overrides)
+    return PatientInfo(**fields)
+
+
+class TestCompilePredicate:
+    def test_comparison_on_var(self):
+        predicate = compile_predicate({">=": [{"var": "age"}, 40]})
+        assert predicate({"age": 40})
+        assert not predicate({"age": 39})
+
+    def test_boolean_operators(self):
+        predicate = compile_predicate({"and": [
+            {">": [{"var": "age"}, 18]},
+            {"not": {"or": [{"==": [{"var": "age"}, 30]}, {"==": [{"var": "age"}, 31]}]}},
+        ]})
+        assert predicate({"age": 40})
+        assert not predicate({"age": 30})
+        assert not predicate({"age": 10})
+
+    def test_any_symptom_is_case_insensitive_regex(self):
+        predicate = compile_predicate({"any_symptom": "ha?emoptysis"})
+        assert predicate({"symptoms": ["fatigue", "Unexplained Hemoptysis"]})
+        assert not predicate({"symptoms": ["cough"]})
+
+    def test_unknown_operator_raises(self):
+        with pytest.raises(ValueError):
+            compile_predicate({"between": [1, 2]})
+
+
+class TestMatchRule:
+    def test_no_symptoms_is_low_risk(self):
+        rule = match_rule(_patient(symptoms=[]))
+        assert rule["id"] == "no-symptoms"
+        assert rule["risk_level"] == "Low Risk - Routine Follow-up"
+
+    def test_urgent_presentation_falls_through(self):
+        assert match_rule(get_patient("PT-101")) is None
+
+    def test_demo_patients_all_go_to_the_agent(self):
+        assert all(match_rule(get_patient(f"PT-{n}")) is None for n in range(101, 111))
+
+    def test_assessment_template_formats(self):
+        patient = _patient(symptoms=[])
+        assert match_rule(patient)["assessment"].format(**patient.model_dump()).startswith("Test Patient (50, Female)")
@@ -0,0 +1,136 @@
+"""Tests for the embedding-keyed semantic cache."""
+
+import numpy as np
+import pytest
+
+from app import semantic_cache
+from app.semantic_cache import SemanticCache
+
+
+def _unit(rng, dim=64):
+    v = rng.standard_normal(dim).astype(np.float32)
+    return v / np.linalg.norm(v)
+
+
+class TestSemanticCache:
+    def test_miss_on_empty_cache(self):
+        cache = SemanticCache()
+        assert cache.get(np.ones(8)) is None
+
+    def test_hit_on_same_vector(self):
+        rng = np.random.default_rng(1)
+        v = _unit(rng)
+        cache = SemanticCache()
+        cache.put(v, "chunks")
+        assert cache.get(v) == "chunks"
+
+    def test_hit_on_near_duplicate(self):
+        rng = np.random.default_rng(2)
+        v = _unit(rng)
+        cache = SemanticCache(threshold=0.95)
+        cache.put(v, "chunks")
+        assert cache.get(v + 0.01 * _unit(rng)) == "chunks"
+
+    def test_miss_on_unrelated_vector(self):
+        rng = np.random.default_rng(3)
+        cache = SemanticCache()
+        cache.put(_unit(rng), "chunks")
+        assert cache.get(_unit(rng)) is None
+
+    def test_put_replaces_near_identical_entry(self):
+        rng = np.random.default_rng(4)
+        v = _unit(rng)
+        cache = SemanticCache()
+        cache.put(v, "old")
+        cache.put(v, "new")
+        assert len(cache) == 1
+        assert cache.get(v) == "new"
+
+    def test_evicts_least_recently_used(self):
+        rng = np.random.default_rng(5)
+        a, b, c = _unit(rng), _unit(rng), _unit(rng)
+        cache = SemanticCache(max_entries=2)
+        cache.put(a, "a")
+        cache.put(b, "b")
+        cache.get(a)
+        cache.put(c, "c")
+        assert len(cache) == 2
+        assert cache.get(b) is None
+        assert cache.get(a) == "a"
+        assert cache.get(c) == "c"
+
+    def test_clear(self):
+        rng = np.random.default_rng(6)
+        v = _unit(rng)
+        cache = SemanticCache()
+        cache.put(v, "chunks")
+        cache.clear()
+        assert len(cache) == 0
+        assert cache.get(v) is None
+
+    def test_entries_expire(self, monkeypatch):
+        rng = np.random.default_rng(11)
+        v = _unit(rng)
+        now = [1000.0]
+        monkeypatch.setattr(semantic_cache.time, "monotonic", lambda: now[0])
+        cache = SemanticCache(ttl_seconds=300)
+        cache.put(v, "chunks")
+        now[0] += 299
+        assert cache.get(v) == "chunks"
+        now[0] += 2
+        assert cache.get(v) is None
+        assert len(cache) == 0
+
+    def test_evicted_row_is_reused(self):
+        rng = np.random.default_rng(12)
+        vectors = [_unit(rng) for _ in range(3)]
+        cache = SemanticCache(max_entries=2)
+        for i, v in enumerate(vectors):
+            cache.put(v, i)
+        assert cache._rows_in_use == 2
+        assert cache.get(vectors[0]) is None
+        assert cache.get(vectors[2]) == 2
+
+    def test_many_entries_grow_storage(self):
+        rng = np.random.default_rng(7)
+        vectors = [_unit(rng) for _ in range(200)]
+        cache = SemanticCache(max_entries=150)
+        for i, v in enumerate(vectors):
+            cache.put(v, i)
+        assert len(cache) == 150
+        assert cache.get(vectors[0]) is None
+        assert cache.get(vectors[-1]) == 199
+
+
+class TestKernels:
+    def test_cos_scan_matches_numpy(self):
+        rng = np.random.default_rng(9)
+        vectors = [_unit(rng, dim=768) for _ in range(32)]
+        quantized = [semantic_cache._quantize(v) for v in vectors]
+        matrix = np.stack([q8 for q8, _ in quantized])
+        scales = np.array([scale for _, scale in quantized], dtype=np.float32)
+        q = vectors[11]
+        sims = semantic_cache._cos_scan(matrix, scales, 16, q)
+        expected = semantic_cache._cos_scan_numpy(matrix, scales, 16, q)
+        assert sims.shape == (16,)
+        assert int(np.argmax(sims)) == int(np.argmax(expected)) == 11
+        np.testing.assert_allclose(sims, expected, atol=1e-4)
+
+    def test_quantization_preserves_cosine(self):
+        rng = np.random.default_rng(10)
+        a, b = _unit(rng, dim=3072), _unit(rng, dim=3072)
+        q8, scale = semantic_cache._quantize(a)
+        assert abs(float(q8 @ a) * scale - 1.0) < 1e-3
+        assert abs(float(q8 @ b) * scale - float(a @ b)) < 1e-3
+
+    def test_lookups_reuse_the_startup_compilation(self):
+        if semantic_cache.njit is None:
+            pytest.skip("Numba not installed")
+        semantic_cache.compile_kernels()
+        signatures = list(semantic_cache._cos_scan.signatures)
+        cache = SemanticCache(threshold=0.9)
+        rng = np.random.default_rng(11)
+        v = _unit(rng, dim=768)
+        cache.put(v, "value")
+        assert cache.get(v) == "value"
+        assert semantic_cache._cos_scan.signatures == signatures
@@ -0,0 +1,76 @@
+"""Tests for the in-process chat session store and the history sent to the model."""
+
+from app.chat import HISTORY_MAX_MESSAGES, HISTORY_TOKEN_BUDGET, _history_window
+from app.models import ChatMessage
+from app.sessions import InMemorySessionStore
+
+
+def _msg(content: str, role: str = "user") -> ChatMessage:
+    return ChatMessage(role=role, content=content)
+
+
+class TestInMemorySessionStore:
+    def test_unknown_session_is_empty(self):
+        assert InMemorySessionStore().get("missing") == []
+
+    def test_append_and_get(self):
+        store = InMemorySessionStore()
+        store.append("s1", _msg("hi"), _msg("hello", role="assistant"))
+        assert [m.content for m in store.get("s1")] == ["hi", "hello"]
+
+    def test_history_is_capped(self):
+        store = InMemorySessionStore(max_messages=3)
+        for i in range(5):
+            store.append("s1", _msg(str(i)))
+        assert [m.content for m in store.get("s1")] == ["2", "3", "4"]
+
+    def test_get_last_messages(self):
+        store = InMemorySessionStore()
+        for i in range(5):
+            store.append("s1", _msg(str(i)))
+        assert [m.content for m in store.get("s1", last=2)] == ["3", "4"]
+        assert len(store.get("s1", last=10)) == 5
+        assert store.get("s1", last=0) == []
+
+    def test_least_recently_used_session_is_evicted(self):
+        store = InMemorySessionStore(max_sessions=2)
+        store.append("a", _msg("a"))
+        store.append("b", _msg("b"))
+        store.get("a")
+        store.append("c", _msg("c"))
+        assert store.get("b") == []
+        assert store.get("a")
+        assert store.get("c")
+
+    def test_delete(self):
+        store = InMemorySessionStore()
+        store.append("s1", _msg("hi"))
+        assert store.delete("s1") is True
+        assert store.delete("s1") is False
+        assert store.get("s1") == []
+
+
+class TestHistoryWindow:
+    def _pairs(self, n: int, size: int) -> list[ChatMessage]:
+        history = []
+        for i in range(n):
+            history += [_msg(f"q{i}".ljust(size)), _msg(f"a{i}".ljust(size), role="assistant")]
+        return history
+
+    def test_short_history_is_kept(self):
+        history = self._pairs(3, 10)
+        assert _history_window(history) == history
+
+    def test_capped_at_max_messages(self):
+        history = self._pairs(15, 10)
+        assert _history_window(history) == history[-HISTORY_MAX_MESSAGES:]
+
+    def test_oldest_pairs_dropped_over_budget(self):
+        history = self._pairs(6, HISTORY_TOKEN_BUDGET * 4 // 5)  # ~800 tokens per message
+        window = _history_window(history)
+        assert window == history[-4:]
+        assert window[0].role == "user"
+
+    def test_latest_pair_kept_even_if_oversized(self):
+        history = self._pairs(2, HISTORY_TOKEN_BUDGET * 8)
+        assert _history_window(history) == history[-2:]
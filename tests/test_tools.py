@@ -1,8 +1,9 @@
 """Tests for patient lookup tool."""
 
+import orjson
 import pytest
 
-from app.tools import get_patient, list_patient_ids
+from app.tools import get_patient, get_patient_json, list_patient_ids, reload_patients
 
 
 class TestListPatientIds:
@@ -49,3 +50,26 @@ class TestGetPatient:
         assert patient.smoking_history == "Ex-Smoker"
         assert "iron-deficiency anaemia" in patient.symptoms
         assert patient.symptom_duration_days == 60
+
+
+class TestGetPatientJson:
+    def test_serializes_patient(self):
+        data = orjson.loads(get_patient_json("PT-101"))
+        assert data["patient_id"] == "PT-101"
+        assert data["symptoms"] == get_patient("PT-101").symptoms
+
+    def test_invalid_patient_raises(self):
+        with pytest.raises(KeyError):
+            get_patient_json("PT-999")
+
+    def test_reload_clears_cached_json(self):
+        get_patient_json("PT-101")
+        reload_patients()
+        assert get_patient_json.cache_info().currsize == 0
+        assert get_patient("PT-101").name == "John Doe"
+
+    def test_records_are_parsed_once(self):
+        reload_patients()
+        first = get_patient("PT-101")
+        list_patient_ids()
+        assert get_patient("PT-101") is first
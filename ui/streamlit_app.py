@@ -1,23 +1,121 @@
 """Streamlit UI for NG12 Cancer Risk Assessor."""
 
+import json
 import os
+import time
 import uuid
 
+import numpy as np
 import requests
 import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 API_URL = os.environ.get("API_URL", "http://localhost:8000")
+HEALTH_RECHECK_SECONDS = 60
+
+
+@st.cache_resource
+def _session() -> requests.Session:
+    """One keep-alive HTTP session per Streamlit process, so reruns reuse open connections.
+
+    Failed connections are retried; a POST that reached the API is never resent.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=Retry(total=2, backoff_factor=0.1))
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def ensure_api_healthy() -> None:
+    """Probe /health once per browser session, then again at most once a minute."""
+    now = time.time()
+    last_check = st.session_state.get("_last_health_check", 0)
+    if st.session_state.get("_api_healthy") and now - last_check < HEALTH_RECHECK_SECONDS:
+        return
+    try:
+        _session().get(f"{API_URL}/health", timeout=5).raise_for_status()
+    except Exception:
+        st.session_state._api_healthy = False
+        st.error(f"Could not connect to API at {API_URL}. Is the FastAPI server running?")
+        st.stop()
+    st.session_state._api_healthy = True
+    st.session_state._last_health_check = now
+
+
+# Patient data is static, so it is fetched every few minutes rather than on every rerun.
+# Failed requests raise, and st.cache_data never caches an exception.
+
+@st.cache_data(ttl=300, show_spinner=False)
+def fetch_all_patients() -> dict[str, dict]:
+    """Every patient record in one request, so changing the selection needs no network call."""
+    response = _session().get(f"{API_URL}/patients/bulk", timeout=5)
+    response.raise_for_status()
+    return {p["patient_id"]: p for p in response.json()["patients"]}
+
+
+class StreamError(Exception):
+    """The API reported a failure in the middle of a streamed response."""
+
+
+def stream_events(path: str, payload: dict, timeout: int = 60):
+    """POST to a streaming endpoint and yield its Server-Sent Events as dicts."""
+    with _session().post(f"{API_URL}{path}", json=payload, stream=True, timeout=timeout) as resp:
+        if resp.status_code != 200:
+            raise StreamError(f"API error: {resp.status_code} - {resp.text}")
+        for line in resp.iter_lines():
+            if not line.startswith(b"data: "):
+                continue
+            event = json.loads(line[len(b"data: "):])
+            if event["type"] == "error":
+                raise StreamError(event["detail"])
+            yield event
+            if event["type"] == "done":
+                return
+    raise StreamError("The API closed the connection before the response was complete.")
+
+
+def unique_citations(citations: list[dict]) -> list[dict]:
+    """Drop repeated citations of the same chunk, keeping the first occurrence of each."""
+    if len(citations) < 2:
+        return citations
+    _, first = np.unique(np.array([c["chunk_id"] for c in citations]), return_index=True)
+    return [citations[i] for i in np.sort(first)]
+
+
+def render_citations(citations: list[dict], key: str, show_source: bool = False) -> None:
+    """All citations as one Arrow-backed table; selecting a row shows its full excerpt."""
+    table = {"page": [c["page"] for c in citations], "chunk_id": [c["chunk_id"] for c in citations]}
+    if show_source:
+        table["source"] = [c["source"] for c in citations]
+    table["excerpt"] = [c["excerpt"] for c in citations]
+
+    event = st.dataframe(
+        table,
+        hide_index=True,
+        key=key,
+        on_select="rerun",
+        selection_mode="single-row",
+        column_config={
+            "page": st.column_config.NumberColumn("Page", width="small"),
+            "chunk_id": st.column_config.TextColumn("Chunk", width="medium"),
+            "source": st.column_config.TextColumn("Source", width="small"),
+            "excerpt": st.column_config.TextColumn("Excerpt", width="large"),
+        },
+    )
+    if event.selection.rows:
+        cit = citations[event.selection.rows[0]]
+        with st.expander(f"[NG12 p.{cit['page']}] {cit['chunk_id']}", expanded=True):
+            st.text(cit["excerpt"])
+
 
 st.set_page_config(page_title="NG12 Cancer Risk Assessor", layout="wide")
 st.title("NG12 Cancer Risk Assessor")
 st.markdown("Clinical Decision Support powered by NG12 guidelines and Google Gemini")
 st.divider()
 
-try:
-    requests.get(f"{API_URL}/health", timeout=5)
-except Exception:
-    st.error(f"Could not connect to API at {API_URL}. Is the FastAPI server running?")
-    st.stop()
+ensure_api_healthy()
 
 tab_assess, tab_chat = st.tabs(["Risk Assessment", "NG12 Chat"])
 
@@ -26,11 +124,11 @@ tab_assess, tab_chat = st.tabs(["Risk Assessment", "NG12 Chat"])
 
 with tab_assess:
     try:
-        response = requests.get(f"{API_URL}/patients", timeout=5)
-        patient_ids = response.json()["patient_ids"]
+        patients = fetch_all_patients()
     except Exception:
         st.error("Could not fetch patient list.")
-        patient_ids = []
+        patients = {}
+    patient_ids = list(patients)
 
     col1, col2 = st.columns([1, 2])
 
@@ -40,8 +138,7 @@ with tab_assess:
 
         if selected_id:
             try:
-                patient_resp = requests.get(f"{API_URL}/patients/{selected_id}", timeout=5)
-                patient = patient_resp.json()
+                patient = patients[selected_id]
                 st.markdown(f"**Name:** {patient['name']}")
                 st.markdown(f"**Age:** {patient['age']} | **Gender:** {patient['gender']}")
                 st.markdown(f"**Smoking:** {patient['smoking_history']}")
@@ -56,52 +153,59 @@ with tab_assess:
         st.subheader("Risk Assessment")
 
         if assess_button and selected_id:
-            with st.spinner("Analyzing patient data against NG12 guidelines..."):
-                try:
-                    resp = requests.post(
-                        f"{API_URL}/assess",
-                        json={"patient_id": selected_id},
-                        timeout=60,
-                    )
-
-                    if resp.status_code == 200:
-                        result = resp.json()
-                        risk = result["risk_level"]
-
-                        if "Urgent Referral" in risk:
-                            st.error(f"**Risk Level: {risk}**")
-                        elif "Urgent Investigation" in risk:
-                            st.warning(f"**Risk Level: {risk}**")
-                        elif "Non-Urgent" in risk:
-                            st.info(f"**Risk Level: {risk}**")
-                        else:
-                            st.success(f"**Risk Level: {risk}**")
-
-                        st.markdown("### Clinical Assessment")
-                        st.markdown(result["assessment"])
-
-                        if result.get("citations"):
-                            st.markdown("### NG12 Guideline Citations")
-                            for i, citation in enumerate(result["citations"], 1):
-                                with st.expander(f"Citation {i}"):
-                                    st.markdown(f"**Source:** {citation['source']}")
-                                    st.markdown(f"**Page:** {citation['page']}")
-                                    st.markdown("**Excerpt:**")
-                                    st.text(citation["excerpt"])
-                    else:
-                        st.error(f"API error: {resp.status_code} - {resp.text}")
-
-                except requests.exceptions.Timeout:
-                    st.error("Request timed out. The assessment may take longer for complex cases.")
-                except Exception as e:
-                    st.error(f"Error: {str(e)}")
+            # Kept in session state so reruns (e.g. selecting a citation row) still show it
+            st.session_state.pop("assessment", None)
+            try:
+                with st.status("Analyzing patient data against NG12 guidelines...") as status:
+                    try:
+                        for event in stream_events("/assess/stream", {"patient_id": selected_id}):
+                            if event["type"] == "status":
+                                status.write(event["text"])
+                            elif event["type"] == "done":
+                                event["citations"] = unique_citations(event["citations"])
+                                st.session_state.assessment = event
+                    except Exception:
+                        # The error itself is shown below the status box by the handlers that follow
+                        status.update(label="Assessment failed", state="error")
+                        raise
+                    status.update(label="Assessment complete", state="complete", expanded=False)
+
+            except StreamError as e:
+                st.error(str(e))
+            except requests.exceptions.Timeout:
+                st.error("Request timed out. The assessment may take longer for complex cases.")
+            except Exception as e:
+                st.error(f"Error: {str(e)}")
+
+        result = st.session_state.get("assessment")
+        if result and result["patient_id"] == selected_id:
+            risk = result["risk_level"]
+
+            if "Urgent Referral" in risk:
+                st.error(f"**Risk Level: {risk}**")
+            elif "Urgent Investigation" in risk:
+                st.warning(f"**Risk Level: {risk}**")
+            elif "Non-Urgent" in risk:
+                st.info(f"**Risk Level: {risk}**")
+            else:
+                st.success(f"**Risk Level: {risk}**")
+
+            st.markdown("### Clinical Assessment")
+            st.markdown(result["assessment"])
+
+            if result.get("citations"):
+                st.markdown("### NG12 Guideline Citations")
+                render_citations(result["citations"], key="assess_citations", show_source=True)
         elif not assess_button:
             st.info("Select a patient and click 'Assess Cancer Risk' to begin.")
 
 
 # -- NG12 Chat Tab --
 
-with tab_chat:
+@st.fragment
+def chat_tab():
+    """The chat tab runs as a fragment, so sending a message reruns only this tab
+    rather than the whole app (health check, patient panel and assessment)."""
     st.subheader("Chat with NG12 Guidelines")
     st.markdown(
         "Ask questions about the NICE NG12 cancer referral guidelines. "
@@ -114,61 +218,73 @@ with tab_chat:
         st.session_state.chat_messages = []
 
     if st.button("New Chat", key="new_chat"):
+        # Drop the old conversation server-side too, so its history stops taking up the session store
+        try:
+            _session().delete(f"{API_URL}/chat/{st.session_state.chat_session_id}", timeout=5)
+        except requests.exceptions.RequestException:
+            pass
         st.session_state.chat_session_id = str(uuid.uuid4())
         st.session_state.chat_messages = []
-        st.rerun()
 
     chat_container = st.container()
     user_input = st.chat_input("Ask about NG12 guidelines...")
 
     with chat_container:
-        for msg in st.session_state.chat_messages:
+        for index, msg in enumerate(st.session_state.chat_messages):
             with st.chat_message(msg["role"]):
                 st.markdown(msg["content"])
                 if msg["role"] == "assistant" and msg.get("citations"):
-                    for i, cit in enumerate(msg["citations"], 1):
-                        with st.expander(f"[NG12 p.{cit['page']}] {cit['chunk_id']}"):
-                            st.text(cit["excerpt"])
+                    render_citations(msg["citations"], key=f"chat_citations_{index}")
 
         if user_input:
+            # Recorded before the request, so the question stays in the transcript even if it fails
+            st.session_state.chat_messages.append({"role": "user", "content": user_input, "citations": []})
             with st.chat_message("user"):
                 st.markdown(user_input)
 
             with st.chat_message("assistant"):
-                with st.spinner("Searching NG12 guidelines..."):
-                    try:
-                        resp = requests.post(
-                            f"{API_URL}/chat",
-                            json={
+                try:
+                    done = {}
+
+                    def answer_tokens():
+                        for event in stream_events(
+                            "/chat/stream",
+                            {
                                 "session_id": st.session_state.chat_session_id,
                                 "message": user_input,
                                 "top_k": 5,
                             },
-                            timeout=60,
-                        )
-
-                        if resp.status_code == 200:
-                            data = resp.json()
-                            answer = data["answer"]
-                            citations = data.get("citations", [])
-
-                            st.markdown(answer)
-
-                            if citations:
-                                for i, cit in enumerate(citations, 1):
-                                    with st.expander(f"[NG12 p.{cit['page']}] {cit['chunk_id']}"):
-                                        st.text(cit["excerpt"])
-
-                            st.session_state.chat_messages.append(
-                                {"role": "user", "content": user_input, "citations": []}
-                            )
-                            st.session_state.chat_messages.append(
-                                {"role": "assistant", "content": answer, "citations": citations}
-                            )
-                        else:
-                            st.error(f"API error: {resp.status_code} - {resp.text}")
-
-                    except requests.exceptions.Timeout:
-                        st.error("Request timed out. Try a simpler question.")
-                    except Exception as e:
-                        st.error(f"Error: {str(e)}")
+                        ):
+                            if event["type"] == "token":
+                                yield event["text"]
+                            elif event["type"] == "done":
+                                done.update(event)
+
+                    with st.spinner("Searching NG12 guidelines..."):
+                        tokens = answer_tokens()
+                        first = next(tokens, "")
+
+                    def replay():
+                        yield first
+                        yield from tokens
+
+                    st.write_stream(replay())
+                    citations = unique_citations(done.get("citations", []))
+
+                    if citations:
+                        render_citations(citations, key=f"chat_citations_{len(st.session_state.chat_messages)}")
+
+                    st.session_state.chat_messages.append(
+                        {"role": "assistant", "content": done["answer"], "citations": citations}
+                    )
+
+                except StreamError as e:
+                    st.error(str(e))
+                except requests.exceptions.Timeout:
+                    st.error("Request timed out. Try a simpler question.")
+                except Exception as e:
+                    st.error(f"Error: {str(e)}")
+
+
+with tab_chat:
+    chat_tab()